@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark of every stage of a conversion (parse, stats and report,
+filters, GPX files and graphs) over synthetic rides of several sizes.
+The timings are written as JSON, and can be compared with the ones of
+another version (--compare).
+"""
+import json
+import platform
+import sys
+from datetime import datetime
+from importlib.util import find_spec
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from click import command, option
+from click import IntRange as TypeIntRange
+from click import Path as TypePath
+import numpy as np
+
+base_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(base_dir))
+
+from rideology2gpx_tool.app_info import version
+from rideology2gpx_tool.data_file import DataFile
+from synthetic import generate
+
+
+start_time = datetime(1979, 8, 9, 9, 25)
+
+
+def best_of(fnc, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        start = perf_counter()
+        fnc(*args)
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def run_stages(filename, repeat, output_dir, graph):
+
+    table = DataFile(filename).table
+
+    def fresh():
+        # A DataFile with the table already parsed and nothing cached
+        datafile = DataFile(filename)
+        datafile._set_table(table)
+        return (datafile,)
+
+    gpx_filename = output_dir / 'ride.gpx'
+
+    stages = {
+        'parse': lambda: DataFile(filename).load(),
+        'parse (streaming)': lambda: DataFile(filename)._parse_stream(),
+        'stats and report': lambda d: d.report,
+        'filter by distance': lambda d: d.filter_by_distance(
+            1).filter_by_distance(-1),
+        'filter by speed': lambda d: d.filter_by_speed(0, None),
+        'resample 10 Hz': lambda d: d.resampled(100),
+        'gpx track': lambda d: d.new_gpxfile(
+            start_time=start_time).dump_to_file(gpx_filename),
+        'gpx gear shifts': lambda d: d.new_gpxfile_gear_shifts(
+            start_time=start_time).dump_to_file(gpx_filename),
+        'gpx speed shifts': lambda d: d.new_gpxfile_speed_shifts(
+            start_time=start_time).dump_to_file(gpx_filename),
+    }
+
+    results = {}
+    for name, fnc in stages.items():
+        setup = None if name.startswith('parse') else fresh
+        results[name] = best_of(fnc, repeat, setup)
+
+    if graph:
+        if not all([find_spec(m) for m in ['pandas', 'plotly']]):
+            results['data frame'] = results['graphs'] = None
+        else:
+            results['data frame'] = best_of(
+                lambda d: d.data_frame(start_time), repeat, fresh)
+            results['graphs'] = best_of(
+                lambda d: d.dump_md(start_time=start_time,
+                                    output_dir=output_dir),
+                repeat, fresh)
+
+    return results
+
+
+def compare(results, old, file=sys.stderr):
+    print(f"{'rows':>10}  {'stage':<20} {'old':>9} {'new':>9} {'ratio':>7}",
+          file=file)
+    for rows, stages in results['rows'].items():
+        for name, seconds in stages.items():
+            before = old.get('rows', {}).get(rows, {}).get(name)
+            if seconds is None or not before:
+                continue
+            print(f"{rows:>10}  {name:<20} {before:9.3f} {seconds:9.3f} "
+                  f"{seconds/before:7.2f}", file=file)
+
+
+@command()
+@option('-n', '--rows', 'rows', type=TypeIntRange(1, None), multiple=True,
+        default=[10000, 100000], show_default=True,
+        help='Number of rows of the synthetic rides (repeatable).')
+@option('-r', '--repeat', 'repeat', type=TypeIntRange(1, None), default=3,
+        help='Number of runs of each stage, the best one is used.')
+@option('-s', '--seed', 'seed', type=int, default=0,
+        help='Seed of the synthetic rides.')
+@option('-g', '--graph', 'graph', is_flag=True,
+        help='Also time the data frame and the graphs (needs pandas, '
+             'plotly and kaleido).')
+@option('-o', '--output', 'output', type=TypePath(dir_okay=False),
+        default=None, help='JSON file for the results (default: stdout).')
+@option('-c', '--compare', 'old', type=TypePath(exists=True, dir_okay=False),
+        default=None, help='JSON results of another version to compare.')
+def cli(rows, repeat, seed, graph, output, old):
+
+    results = {
+        'version': version,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'repeat': repeat,
+        'seed': seed,
+        'rows': {},
+    }
+
+    with TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for n in rows:
+            filename = generate(tmp / f"ride_{n}.csv", n, seed)
+            results['rows'][str(n)] = run_stages(filename, repeat, tmp, graph)
+            filename.unlink()
+
+    text = json.dumps(results, indent=2)
+    if output is None:
+        print(text)
+    else:
+        with open(output, 'w') as file:
+            print(text, file=file)
+
+    if old is not None:
+        with open(old, 'r') as file:
+            compare(results, json.load(file))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark, asserts that importing rideology2gpx_tool.cli (and
+running 'rideology2gpx --version') stays under a time budget.
+"""
+from subprocess import run
+from sys import executable, exit
+from time import perf_counter
+from pathlib import Path
+from click import command, option
+
+
+base_dir = Path(__file__).resolve().parent.parent
+
+
+def best_of(args, repeat):
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        run(args, cwd=base_dir, check=True, capture_output=True)
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+@command()
+@option('-b', '--budget', 'budget', type=float, default=0.5,
+        help='Maximum import time in seconds.')
+@option('-r', '--repeat', 'repeat', type=int, default=5,
+        help='Number of runs, the best one is used.')
+def cli(budget, repeat):
+
+    baseline = best_of([executable, '-c', 'pass'], repeat)
+
+    results = {
+        'import rideology2gpx_tool.cli': best_of(
+            [executable, '-c', 'import rideology2gpx_tool.cli'], repeat),
+        'rideology2gpx --version': best_of(
+            [executable, str(base_dir / 'rideology2gpx'), '--version'],
+            repeat),
+    }
+
+    failed = False
+    for name, seconds in results.items():
+        seconds -= baseline
+        ok = seconds <= budget
+        failed = failed or not ok
+        print(f"{name}: {seconds:.3f} s (budget {budget:.3f} s)",
+              "Ok" if ok else "Too slow")
+
+    heavy = run([executable, '-c', (
+        'import sys, rideology2gpx_tool.cli; '
+        'print(" ".join(m for m in ["pandas", "plotly", "bs4"] '
+        'if m in sys.modules))')],
+        cwd=base_dir, check=True, capture_output=True, text=True
+    ).stdout.strip()
+    if heavy:
+        failed = True
+        print(f"Heavy modules loaded at startup: {heavy}")
+
+    exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Generator of synthetic Rideology CSV files, with the same layout as the
+App exports and plausible speed, gear, RPM and temperature dynamics.
+The output only depends on the number of rows and the seed.
+"""
+from pathlib import Path
+from click import command, option, argument
+from click import IntRange as TypeIntRange
+from click import Path as TypePath
+import numpy as np
+
+
+header = '''UserAccount Name,,user
+Title,,Synthetic ride ({rows} rows)
+Comment,,
+Vehicle Nickname,,user
+Distance,,0
+Time,,0
+R.Score,,0
+"elapsed_msec","gps_latitude","gps_longitude","instant_fuel_consumption",\
+"water_temperature","boost_temperature","engine_RPM","wheel_speed",\
+"acceleration","throttle_position","boost_pressure","gear_position",\
+"brake_pressure_fr_caliper","lean_angle","rideology_score"
+'''
+
+row_format = ('%d,%.6f,%.6f,%.1f,%.1f,0.0,%d,%.1f,%.1f,%d,%.1f,%d,%s,%.1f,'
+              '%.1f,%d')
+
+# Upper speed (km/h) of each gear and rpm per km/h in that gear
+gear_speeds = [15, 30, 50, 70, 90, np.inf]
+gear_ratios = np.array([120, 85, 65, 52, 44, 38])
+
+idle_rpm = 1100
+period_msec = 1000
+chunk_rows = 1000000
+
+
+def knots(rows, rng):
+    """
+    Times (s) and target speeds (km/h) of the ride: stretches of 10 to
+    60 s, about one in six is a stop
+    """
+    n = rows // 10 + 2
+    times = np.concatenate([[0], np.cumsum(rng.integers(10, 60, n))])
+    speeds = rng.uniform(10, 130, n + 1)
+    speeds[rng.random(n + 1) < 1/6] = 0
+    speeds[0] = 0
+    return times, speeds
+
+
+def ride_chunks(rows, seed=0):
+    """
+    Yield the columns of the ride in chunks of at most chunk_rows rows
+    """
+    rng = np.random.default_rng(seed)
+    times, speeds = knots(rows, rng)
+    lat, lon, heading = -34.5082, -58.47964, 0.0
+
+    for start in range(0, rows, chunk_rows):
+        n = min(chunk_rows, rows - start)
+        t = np.arange(start, start + n)
+
+        speed = np.round(np.interp(t, times, speeds))
+        acceleration = np.round(np.diff(np.interp(
+            np.arange(start - 1, start + n), times, speeds)) / 3.6, 1)
+
+        gear = np.searchsorted(gear_speeds, speed)
+        gear_str = np.where(speed > 0, (gear + 1).astype(str), 'N')
+
+        rpm = np.where(speed > 0,
+                       speed * gear_ratios[np.minimum(gear, 5)],
+                       idle_rpm) + rng.integers(-50, 50, n)
+        rpm = np.clip(rpm, idle_rpm - 100, 12000)
+
+        water = np.round(65 + 35 * (1 - np.exp(-t / 600)) +
+                         rng.normal(0, 0.5, n))
+
+        heading = heading + np.cumsum(rng.normal(0, 0.05, n))
+        step = speed / 3.6 / 111320
+        lats = lat + np.cumsum(step * np.cos(heading))
+        lons = lon + np.cumsum(step * np.sin(heading) /
+                               np.cos(np.radians(lats)))
+        lat, lon, heading = lats[-1], lons[-1], heading[-1]
+
+        throttle = np.clip(acceleration * 20 + speed / 2, 0, 100)
+        brake = np.clip(-acceleration * 5, 0, None)
+        lean = np.round(np.sin(heading * 7) * speed / 4, 1)
+
+        yield [t * period_msec + 940, lats, lons, np.zeros(n), water, rpm,
+               speed, acceleration, throttle, np.zeros(n),
+               np.zeros(n, dtype=int), gear_str, brake, lean, np.full(n, 3)]
+
+
+def generate(filename, rows, seed=0):
+    with open(filename, 'w') as file:
+        file.write(header.format(rows=rows))
+        for columns in ride_chunks(rows, seed):
+            file.write('\n'.join([row_format % r for r in zip(
+                *[c.tolist() for c in columns])]))
+            file.write('\n')
+    return Path(filename)
+
+
+@command()
+@argument('filename', type=TypePath(dir_okay=False))
+@option('-n', '--rows', 'rows', type=TypeIntRange(1, None), default=10000,
+        help='Number of data rows.')
+@option('-s', '--seed', 'seed', type=int, default=0,
+        help='Seed of the random generator.')
+def cli(filename, rows, seed):
+    generate(filename, rows, seed)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,88 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout, redirect_stderr
+from glob import glob
+from io import StringIO
+from pathlib import Path
+from tabulate import tabulate
+from .main import main, bye
+from .compressed import compressions
+
+
+csv_patterns = ['*.csv'] + [f"*.csv{s}" for s in compressions.values()]
+
+
+def expand_paths(paths):
+    """
+    Expand files, directories (every *.csv, *.csv.gz and *.csv.zst inside)
+    and glob patterns into a sorted list of files without duplicates
+    """
+    out = []
+    for path in paths:
+        path = str(path)
+        if Path(path).is_dir():
+            matches = sorted([p for pattern in csv_patterns
+                              for p in Path(path).glob(pattern)])
+        elif any(c in path for c in '*?['):
+            matches = [Path(p) for p in sorted(glob(path))]
+        else:
+            matches = [Path(path)]
+        for p in matches:
+            if p not in out:
+                out.append(p)
+    return out
+
+
+def convert(filename, **kargs):
+    """
+    Run main() for a single file isolating its errors, returns the tuple
+    (filename, exit code, error message)
+    """
+    err = StringIO()
+    code = 0
+    try:
+        with redirect_stdout(StringIO()), redirect_stderr(err):
+            main(str(filename), silent=True, **kargs)
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    except Exception as e:
+        code = 3
+        print(f"Error, {e}", file=err)
+    return str(filename), code, err.getvalue().strip()
+
+
+def batch_main(paths, jobs=None, silent=False, **kargs) -> None:
+    """
+    Convert many files in parallel with a pool of processes, each file
+    goes through main() like a single conversion
+    """
+
+    files = expand_paths(paths)
+
+    if not files:
+        bye("no CSV files found.", 1)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(convert, f, **kargs) for f in files]
+        for future in as_completed(futures):
+            filename, code, message = future.result()
+            if not silent:
+                print(f"Convert {repr(filename)}...",
+                      "Ok" if code==0 else f"Error ({code})")
+            results.append((filename, code, message))
+
+    results.sort()
+    failed = [r for r in results if r[1]]
+
+    if not silent:
+        print()
+        if failed:
+            print(tabulate([[f, c, m] for f, c, m in failed],
+                           headers=['File', 'Code', 'Error'],
+                           tablefmt='plain'))
+            print()
+        print(f"{len(results)} files, {len(results) - len(failed)} Ok, "
+              f"{len(failed)} with errors.")
+
+    if failed:
+        bye(None, max([c for _, c, _ in failed]))
@@ -0,0 +1,100 @@
+from hashlib import sha256
+from json import dump, load
+from os import environ, replace, utime
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from numpy import save
+from numpy import load as load_array
+from .table import Table
+
+
+# Change it whenever the parsing (and so the cached columns) changes
+parser_version = 4
+
+default_max_bytes = 512 * 1024**2
+
+
+def default_directory():
+    base = environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'rideology2gpx'
+
+
+class RideCache():
+    """
+    On-disk cache of parsed rides.
+
+    Each entry is a directory named after the SHA-256 of the CSV content,
+    the parser version and the parsed channels. It holds one .npy file per
+    column, loaded with mmap so a cached ride is available without
+    parsing, and a meta.json with the header and the gear categories.
+    When the cache grows over max_bytes the least recently used entries
+    are removed.
+    """
+
+    def __init__(self, directory=None, max_bytes=default_max_bytes):
+        if directory is None:
+            directory = default_directory()
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(filename, channels=(), block_size=1024**2):
+        digest = sha256(f"parser-{parser_version}\n".encode())
+        digest.update(f"{','.join(sorted(channels))}\n".encode())
+        with open(filename, 'rb') as file:
+            for block in iter(lambda: file.read(block_size), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return self.directory / key
+
+    def load(self, key):
+        """
+        Returns (table, header) or None if the ride is not in the cache
+        """
+        path = self._path(key)
+        try:
+            with open(path / 'meta.json', 'r') as file:
+                meta = load(file)
+            columns = {}
+            for name in meta['columns']:
+                columns[name] = load_array(path / f"{name}.npy",
+                                           mmap_mode='r')
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        utime(path)
+        return Table(columns, meta['gears']), meta['header']
+
+    def store(self, key, table, header):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = Path(mkdtemp(dir=self.directory, prefix='.tmp-'))
+        try:
+            for name in table.names:
+                save(tmp / f"{name}.npy", table.column(name))
+            with open(tmp / 'meta.json', 'w') as file:
+                dump({'columns': table.names, 'gears': list(table.gears),
+                      'header': header}, file)
+            replace(tmp, self._path(key))
+        except OSError:
+            # Another process stored the same ride first
+            rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    @staticmethod
+    def _size(path):
+        return sum([f.stat().st_size for f in path.iterdir()])
+
+    def evict(self):
+        entries = []
+        for path in self.directory.iterdir():
+            if path.is_dir() and not path.name.startswith('.'):
+                entries.append((path.stat().st_mtime, self._size(path), path))
+        entries.sort()
+        total = sum([size for _, size, _ in entries])
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            rmtree(path, ignore_errors=True)
+            total -= size
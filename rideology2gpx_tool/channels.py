@@ -0,0 +1,66 @@
+from collections import namedtuple
+from numpy import asarray, int8, int32, int64, float32, float64
+
+
+class Channel(namedtuple('Channel', ('kind', 'dtype'))):
+    """
+    How to convert a telemetry channel:
+
+    - 'int': int(x)
+    - 'float': float(x)
+    - 'float_int': int(float(x))
+    - 'category': a small categorical code, see Table.gears
+    """
+
+    def convert(self, values):
+        """
+        Convert a sequence of strings (one chunk of the column)
+        """
+        if self.kind=='int':
+            return asarray(values, dtype=int64).astype(self.dtype)
+        return asarray(values, dtype=float64).astype(self.dtype)
+
+    @property
+    def fast_kind(self):
+        """
+        Kind of parsing for the mmap reader
+        """
+        return 'float' if self.kind=='float_int' else self.kind
+
+
+# Every channel of a Rideology log, in the order of the CSV columns
+channels = {
+    'elapsed_msec': Channel('int', int64),
+    'gps_latitude': Channel('float', float64),
+    'gps_longitude': Channel('float', float64),
+    'instant_fuel_consumption': Channel('float', float32),
+    'water_temperature': Channel('float_int', int32),
+    'boost_temperature': Channel('float', float32),
+    'engine_rpm': Channel('float_int', int32),
+    'wheel_speed': Channel('float_int', int32),
+    'acceleration': Channel('float', float32),
+    'throttle_position': Channel('float', float32),
+    'accel_grip_position': Channel('float', float32),
+    'boost_pressure': Channel('float', float32),
+    'gear_position': Channel('category', int8),
+    'brake_pressure_fr_caliper': Channel('float', float32),
+    'lean_angle': Channel('float', float32),
+    'rideology_score': Channel('float', float32),
+}
+
+# Channels always materialized, used by the reports and the GPX files
+required_channels = ['elapsed_msec', 'gps_latitude', 'gps_longitude',
+                     'water_temperature', 'engine_rpm', 'wheel_speed',
+                     'gear_position']
+
+
+def select_channels(names=None):
+    """
+    The required channels plus the requested ones, in CSV order
+    """
+    names = list(names or [])
+    unknown = [n for n in names if n not in channels]
+    if unknown:
+        raise ValueError(f"unknown channels: {', '.join(unknown)}")
+    return [n for n in channels.keys()
+            if n in required_channels or n in names]
@@ -2,10 +2,22 @@ from click import command, option, argument
 from click import Path as TypePath
 from click import DateTime as TypeDateTime
 from click import IntRange as TypeIntRange
+from click import Choice as TypeChoice
+from click import FloatRange as TypeFloatRange
 from click.exceptions import UsageError, BadParameter
 from datetime import datetime
+from sys import stdout, stderr
 from pathlib import Path
 from .main import main
+from .data_file import default_max_points, default_radius_m
+from .batch import batch_main, expand_paths
+from .follow import follow_main, default_interval
+from .profiling import Timings, timings_formats, profile
+from .collection import collection_main, periods
+from .render import image_formats
+from .compressed import compressions, has_zstandard, compression
+from .channels import select_channels
+from .channels import channels as all_channels
 from .app_info import app_info, version
 from typing import List, Callable
 
@@ -37,10 +49,17 @@ def dinamic_help_decorator(**wildcards) -> Callable:
         type=TypeDateTime(formats=dt_formats),
         default=dt_str_default,
         help='Starting datetime for the track in the GPX files.')
-@argument('csv_file', type=TypePath(), required=False)
-@argument('output_dir', type=TypePath(), required=False)
+@argument('paths', type=TypePath(), nargs=-1,
+          metavar='[CSV_FILE]... [OUTPUT_DIR]')
 @option('-g', '--graph', 'graph', is_flag=True,
     help='Make graphs and md report.')
+@option('-f', '--image-format', 'image_format',
+        type=TypeChoice(image_formats), default='jpeg',
+        help='Format of the graphs (svg and html skip the raster step).')
+@option('-p', '--plot-points', 'plot_points',
+        type=TypeIntRange(0, None), default=default_max_points,
+        help='Downsample the graphs to about N points (0 plots every row).',
+        metavar="N")
 @option('-s', '--starting-chop', 'starting_chop',
         type=TypeIntRange(0, 10), default=0,
         help='Cut the first X kilometres.', metavar="X")
@@ -50,17 +69,98 @@ def dinamic_help_decorator(**wildcards) -> Callable:
 @option('-a', '--acceleration', 'acceleration',
         type=(str, str), metavar="MIN_SPEED MAX_SPEED",
         help="Filters waypoints to only what is included between the speeds.")
+@option('-R', '--runs', 'runs', type=(TypeIntRange(0, 400),
+                                    TypeIntRange(0, 400)),
+        default=None, metavar="MIN_SPEED MAX_SPEED",
+        help='Find every acceleration run between the speeds and make a GPX '
+             'file with a track segment for each one.')
+@option('--split-runs', 'split_runs', is_flag=True,
+        help='Make a GPX file for each acceleration run.')
+@option('-L', '--location', 'locations', multiple=True,
+        metavar="LAT,LON[,NAME]",
+        help='Report the speed, rpm and gear of each pass through the '
+             'location, and make a GPX file with them (repeatable).')
+@option('--radius', 'radius', type=TypeFloatRange(0, None),
+        default=default_radius_m, show_default=True, metavar="METRES",
+        help='Distance to a location to count as a pass.')
+@option('--resample', 'resample_hz',
+        type=TypeFloatRange(0, 1000, min_open=True), default=None,
+        metavar="HZ",
+        help='Resample the ride at a fixed rate (e.g. 10 or 0.2), '
+             'interpolating the channels and forward filling the gear.')
+@option('-S', '--simplify', 'tolerance',
+        type=TypeFloatRange(0, None), default=None,
+        help='Simplify the track, dropping points closer than METRES to '
+             'the simplified line and collapsing the stops.',
+        metavar="METRES")
+@option('-z', '--compress', 'compress',
+        type=TypeChoice(list(compressions.keys())), default=None,
+        help='Compress the GPX files and the text report on the fly '
+             '(.gpx.gz, .gpx.zst). Compressed CSV files (.csv.gz, '
+             '.csv.zst) are always read without unpacking them first.')
+@option('-C', '--channels', 'channels', default=None,
+    help='Extra telemetry channels to parse and add to the graphs data, '
+         'comma separated (e.g. lean_angle,throttle_position).',
+    metavar="NAME,...")
+@option('-c', '--cache', 'cache', is_flag=True,
+    help='Cache the parsed rides, so the next runs on the same files skip '
+         'the parsing.')
+@option('--cache-dir', 'cache_dir', type=TypePath(file_okay=False),
+    default=None, help='Directory of the cache (implies --cache).',
+    metavar="DIR")
+@option('-F', '--follow', 'follow', is_flag=True,
+    help='Follow a CSV file that is still being written, appending the '
+         'new points to the GPX file until Ctrl+C (the filters are not '
+         'applied).')
+@option('--interval', 'interval', type=TypeFloatRange(0.1, None),
+    default=default_interval, show_default=True,
+    help='Seconds between reads in follow mode.', metavar="SECONDS")
+@option('--idle-timeout', 'idle_timeout', type=TypeFloatRange(0, None),
+    default=None, help='Stop following when the file does not grow for '
+                       'SECONDS.', metavar="SECONDS")
+@option('-t', '--timings', 'timings_format',
+    type=TypeChoice(timings_formats), default=None,
+    help='Print the wall time, CPU time, peak RSS and rows of each stage '
+         '(with json nothing else is printed, for other tools).')
+@option('--profile', 'profile_filename', type=TypePath(dir_okay=False),
+    default=None, help='Run under cProfile and save the stats to FILE '
+                       '(see pstats).', metavar="FILE")
+@option('-r', '--rollup', 'rollup', type=TypeChoice(list(periods.keys())),
+    default=None, help='Report many rides (files, directories or glob '
+                       'patterns) by bike and week or month, no GPX files '
+                       'are made.')
+@option('-o', '--output-dir', 'output_dir',
+        type=TypePath(exists=True, file_okay=False), default=None,
+        metavar='DIR',
+        help='Output directory, instead of OUTPUT_DIR (then every path '
+             'is an input).')
+@option('-b', '--batch', 'batch', is_flag=True,
+    help='Convert many CSV files (files, directories or glob patterns) '
+         'in parallel.')
+@option('-j', '--jobs', 'jobs', type=TypeIntRange(1, None), default=None,
+    help='Number of worker processes in batch and rollup modes (default: '
+         'CPU count).',
+    metavar="N")
 @dinamic_help_decorator(**app_info)
-def cli(csv_file, output_dir, start_time,
+def cli(paths, start_time,
         show_version=False, graph=None, ending_chop=0,
-        starting_chop=0, acceleration=None):
+        starting_chop=0, acceleration=None, batch=False, jobs=None,
+        image_format='jpeg', plot_points=default_max_points,
+        tolerance=None, channels=None, cache=False, cache_dir=None,
+        follow=False, interval=default_interval, idle_timeout=None,
+        timings_format=None, profile_filename=None, runs=None,
+        output_dir=None,
+        split_runs=False, rollup=None, locations=(),
+        radius=default_radius_m, resample_hz=None, compress=None):
     """
     A simple command line program to transform log files obtained with the
     Kawasaki Rideology App into GPX files.
 
     \b
-    CSV_FILE - File obtained with the Kawasaki Rideology App.
-    OUTPUT_DIR - Optional output directory where the files will be created.
+    CSV_FILE - File obtained with the Kawasaki Rideology App (in batch
+    mode many files, directories or glob patterns).
+    OUTPUT_DIR - Optional output directory where the files will be created
+    (in batch mode a directory with CSV files is an input, use -o).
 
     \b
     For more info: {repo_url}
@@ -72,15 +172,92 @@ def cli(csv_file, output_dir, start_time,
         print(version)
         return
 
+    paths = list(paths)
+
     if output_dir is not None:
         output_dir = Path(output_dir)
-        if not output_dir.is_dir():
+    elif len(paths)>1 and Path(paths[-1]).is_dir():
+        if (batch or rollup) and expand_paths(paths[-1:]):
+            # It could be one more input as well
             raise UsageError(
-                "Error: argument 'OUTPUT_DIR' is not a directory.")          
+                f"Error: {repr(paths[-1])} has CSV files, give the output "
+                f"directory with '--output-dir'.")
+        output_dir = Path(paths.pop())
+    elif len(paths)==2 and not batch:
+        raise UsageError(
+            "Error: argument 'OUTPUT_DIR' is not a directory.")          
 
-    if csv_file is None:
+    if not paths:
         raise UsageError("Error: Missing argument 'CSV_FILE'.")
+
+    if len(paths)>1 and not (batch or rollup):
+        raise UsageError(
+            "Error: Many CSV files given, use the '--batch' option.")
+
+    if rollup and (batch or follow):
+        raise UsageError("Error: '--rollup' can not be used with '--batch' "
+                         "or '--follow'.")
+
+    if follow and batch:
+        raise UsageError(
+            "Error: '--follow' can not be used with '--batch'.")
+
+    if compress and follow:
+        raise UsageError(
+            "Error: '--compress' can not be used with '--follow'.")
+
+    if follow and compression(paths[0]) is not None:
+        # A compressed file can not be read while it is being written
+        raise UsageError(
+            "Error: '--follow' can not be used with a compressed file.")
+
+    if compress=='zst' and not has_zstandard():
+        raise BadParameter("the zstandard package is needed for 'zst' "
+                           "(pip install zstandard)",
+                           param_hint="'--compress'")
+
+    if (timings_format or profile_filename) and (batch or follow):
+        raise UsageError("Error: '--timings' and '--profile' can not be "
+                         "used with '--batch' or '--follow'.")
     
+    if channels is not None:
+        channels = [c.strip() for c in channels.split(',') if c.strip()]
+        try:
+            select_channels(channels)
+        except ValueError as e:
+            raise BadParameter(
+                f"{e} (available: {', '.join(all_channels.keys())})")
+
+    parsed_locations = []
+    for n, location in enumerate(locations, 1):
+        fields = [f.strip() for f in location.split(',', 2)]
+        try:
+            lat, lon = float(fields[0]), float(fields[1])
+        except (ValueError, IndexError):
+            raise BadParameter(f"{repr(location)} is not LAT,LON[,NAME]",
+                               param_hint="'--location'")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise BadParameter(f"{repr(location)} is out of range",
+                               param_hint="'--location'")
+        name = fields[2] if len(fields) > 2 else f"Location {n}"
+        parsed_locations.append((lat, lon, name))
+
+    if runs is not None and runs[0] >= runs[1]:
+        raise BadParameter('MIN_SPEED must be lower than MAX_SPEED',
+                           param_hint="'--runs'")
+
+    if rollup:
+        collection_main(paths, output_dir=output_dir, period=rollup,
+                        jobs=jobs, channels=channels,
+                        cache=cache_dir or cache)
+        return
+
+    if follow:
+        follow_main(paths[0], output_dir=output_dir, start_time=start_time,
+                    interval=interval, idle_timeout=idle_timeout,
+                    channels=channels)
+        return
+
     min_speed = None
     max_speed = None
     
@@ -132,10 +309,8 @@ def cli(csv_file, output_dir, start_time,
 
     out_filename_suffix = '(' + '-'.join(out_filename_suffix) + ')'
     
-    main(
-        csv_file,
+    kargs = dict(
         output_dir = output_dir,
-        silent = False,
         start_time=start_time,
         min_speed = min_speed,
         max_speed = max_speed,
@@ -143,5 +318,36 @@ def cli(csv_file, output_dir, start_time,
         starting_chop = starting_chop,
         subtitle = subtitle,
         do_graph = graph,
-        out_filename_suffix = out_filename_suffix
+        out_filename_suffix = out_filename_suffix,
+        image_format = image_format,
+        plot_points = plot_points,
+        tolerance = tolerance,
+        channels = channels,
+        runs = runs,
+        split_runs = split_runs,
+        locations = parsed_locations,
+        radius = radius,
+        resample_hz = resample_hz,
+        compress = compress,
+        cache = cache_dir or cache
     )
+
+    if batch:
+        batch_main(paths, jobs=jobs, **kargs)
+        return
+
+    timings = Timings()
+
+    # Only the JSON goes to stdout, so it can be parsed
+    silent = timings_format=='json'
+
+    if profile_filename:
+        profile(profile_filename, main, paths[0], silent=silent,
+                timings=timings, **kargs)
+        print(f"Profile saved to {repr(str(profile_filename))}",
+              file=(stderr if silent else stdout))
+    else:
+        main(paths[0], silent=silent, timings=timings, **kargs)
+
+    if timings_format:
+        print(timings.dump(timings_format))
@@ -0,0 +1,376 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from sys import stderr
+from numpy import add, maximum, minimum, bincount, unique, zeros, concatenate
+from numpy import asarray, full, diff, flatnonzero, int64
+from tabulate import tabulate
+from .data_file import DataFile, default_radius_m
+from .events import at_rows
+from .spatial import GridIndex
+from .cache import RideCache
+from .geo import haversine
+from .table import Table
+from .batch import expand_paths
+from .main import bye
+from .output import atomic_open
+
+
+periods = {
+    'week': ('Week', '%G-W%V'),
+    'month': ('Month', '%Y-%m'),
+}
+
+# Histogram bins, time spent in each range
+rpm_bin = 1000
+rpm_bins = 16
+speed_bin = 20
+speed_bins = 16
+
+
+def _load_ride(filename, channels=None, cache=None):
+    """
+    Parse a ride (in a worker process), returns the columns, the gear
+    categories and the header, or the error
+    """
+    try:
+        datafile = DataFile(filename, channels=channels, cache=(
+            None if not cache else RideCache(None if cache is True
+                                             else cache)))
+        table = datafile.table
+        columns = {n: asarray(table.column(n)) for n in table.names}
+        return columns, table.gears, datafile.header, None
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        return None, None, None, str(e) or e.__class__.__name__
+
+
+class RideCollection():
+    """
+    Many rides in a single columnar Table, with a ride_id column. The
+    rides are parsed in parallel (one process per core by default) and
+    every metric is computed for all the rides at once with grouped
+    reductions.
+
+    The Rideology exports do not carry the date of the ride, so the
+    modification time of each CSV file is used unless a date is given
+    in dates ({filename: datetime}).
+    """
+
+    def __init__(self, filenames, channels=None, cache=None, dates=None):
+        self._filenames = [Path(f) for f in filenames]
+        self._channels = channels
+        self._ride_cache = cache
+        self._dates = {str(k): v for k, v in (dates or {}).items()}
+        self._table = None
+        self._rides = []
+        self._starts = None
+        self._errors = []
+        self._cache = {}
+
+    def load(self, jobs=None):
+
+        gears = {}
+        tables = []
+        self._rides = []
+        self._errors = []
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = executor.map(
+                _load_ride, [str(f) for f in self._filenames],
+                [self._channels] * len(self._filenames),
+                [self._ride_cache] * len(self._filenames))
+            for filename, (columns, ride_gears, header, error) in zip(
+                    self._filenames, results):
+                if error is None and not len(columns['index']):
+                    error = 'no data'
+                if error is not None:
+                    self._errors.append((str(filename), error))
+                    continue
+                # The gear codes of every ride are mapped to shared ones
+                lookup = asarray([gears.setdefault(g, len(gears))
+                                  for g in ride_gears], dtype=int64)
+                columns['gear_position'] = lookup[columns['gear_position']]
+                columns['ride_id'] = full(len(columns['index']),
+                                          len(self._rides))
+                tables.append(Table.from_lists(columns, ()))
+                self._rides.append(self._ride_info(filename, header))
+
+        names = tables[0].names if tables else ['index', 'ride_id']
+        self._table = Table.concat(tables, gears.keys(), names)
+        self._starts = flatnonzero(diff(concatenate(
+            [[-1], self._table.column('ride_id')])))
+        self._cache = {}
+        return self
+
+    def _ride_info(self, filename, header):
+        date = self._dates.get(str(filename))
+        if date is None:
+            date = datetime.fromtimestamp(filename.stat().st_mtime)
+        return {
+            'filename': str(filename),
+            'title': ' '.join(header.get('Title', '').split()),
+            'bike': header.get('Vehicle Nickname', ''),
+            'date': date,
+        }
+
+    @property
+    def table(self):
+        if self._table is None:
+            self.load()
+        return self._table
+
+    @property
+    def rides(self):
+        self.table
+        return self._rides
+
+    @property
+    def errors(self):
+        return self._errors
+
+    def __len__(self):
+        return len(self.rides)
+
+    def _cached(self, key, fnc):
+        if key not in self._cache:
+            self._cache[key] = fnc()
+        return self._cache[key]
+
+    @property
+    def spatial_index(self):
+        """
+        Grid index of the points of every ride, see spatial.GridIndex
+        """
+        return self._cached('spatial_index', lambda: GridIndex(
+            self.table.column('gps_latitude'),
+            self.table.column('gps_longitude')))
+
+    def near(self, lat, lon, metres=default_radius_m):
+        """
+        Positions of the rows (of any ride) at most metres away from
+        (lat, lon), the ride of each one is in the ride_id column
+        """
+        return self.spatial_index.radius(lat, lon, metres)
+
+    def passes_at(self, lat, lon, metres=default_radius_m):
+        """
+        (ride ids, events) with the closest row of each pass of every
+        ride through (lat, lon), see DataFile.passes_at()
+        """
+        ride_id = self.table.column('ride_id')
+        rows = self.spatial_index.closest_passes(lat, lon, metres, ride_id)
+        return ride_id[rows], at_rows(self.table, rows)
+
+    @property
+    def ride_metrics(self):
+        """
+        The metrics of the ride report for each ride, as arrays indexed
+        by ride_id, plus the time in each gear and the RPM and speed
+        histograms (seconds)
+        """
+        return self._cached('ride_metrics', self._ride_metrics)
+
+    def _ride_metrics(self):
+
+        t = self.table
+        starts = self._starts
+        n_rides = len(starts)
+        n_gears = len(t.gears)
+
+        ride_id = t.column('ride_id')
+        engine_rpm = t.column('engine_rpm').astype(int64)
+        wheel_speed = t.column('wheel_speed').astype(int64)
+        water_temperature = t.column('water_temperature')
+        elapsed_msec = t.column('elapsed_msec')
+        lat, lon = t.column('gps_latitude'), t.column('gps_longitude')
+        codes = t.column('gear_position')
+
+        # Steps between consecutive rows of the same ride
+        same = ride_id[1:] == ride_id[:-1]
+        steps = haversine(lat[:-1], lon[:-1], lat[1:], lon[1:]) * same
+        dt = diff(elapsed_msec) * same / 1000
+        steps = concatenate([[0], steps])
+        dt = concatenate([dt, [0]])
+
+        neutral = t.gears.index('N') if 'N' in t.gears else -1
+        idle = (engine_rpm != 0) & (wheel_speed == 0) & \
+            (water_temperature > 80) & (codes == neutral)
+        moving = wheel_speed != 0
+
+        def hist(values, width, bins):
+            b = minimum(values // width, bins - 1)
+            return bincount(ride_id * bins + b, weights=dt,
+                            minlength=n_rides * bins).reshape(n_rides, bins)
+
+        return {
+            'rows': diff(concatenate([starts, [len(t)]])),
+            'distance': add.reduceat(steps, starts),
+            'elapsed_msec': maximum.reduceat(elapsed_msec, starts) -
+                            minimum.reduceat(elapsed_msec, starts),
+            'max_engine_rpm': maximum.reduceat(engine_rpm, starts),
+            'max_wheel_speed': maximum.reduceat(wheel_speed, starts),
+            'max_water_temperature': maximum.reduceat(water_temperature,
+                                                      starts),
+            'idle_count': bincount(ride_id, weights=idle,
+                                   minlength=n_rides),
+            'idle_engine_rpm_sum': bincount(ride_id,
+                                            weights=engine_rpm * idle,
+                                            minlength=n_rides),
+            'moving_count': bincount(ride_id, weights=moving,
+                                     minlength=n_rides),
+            'moving_wheel_speed_sum': bincount(ride_id,
+                                               weights=wheel_speed * moving,
+                                               minlength=n_rides),
+            'gear_time': bincount(ride_id * n_gears + codes, weights=dt,
+                                  minlength=n_rides * n_gears
+                                  ).reshape(n_rides, n_gears),
+            'rpm_histogram': hist(engine_rpm, rpm_bin, rpm_bins),
+            'speed_histogram': hist(wheel_speed, speed_bin, speed_bins),
+        }
+
+    def rollup(self, period='week'):
+        """
+        The metrics grouped by bike and period ('week' or 'month'),
+        returns (keys, metrics) with keys a list of (bike, period)
+        """
+        if period not in periods:
+            raise ValueError(f"unknown period {repr(period)}")
+        return self._cached(('rollup', period), lambda: self._rollup(period))
+
+    def _rollup(self, period):
+
+        fmt = periods[period][1]
+        keys = [(r['bike'], r['date'].strftime(fmt)) for r in self.rides]
+        if not keys:
+            return [], {}
+        groups, group_id = unique(asarray(keys), axis=0, return_inverse=True)
+        group_id = group_id.ravel()
+        n = len(groups)
+
+        out = {'rides': bincount(group_id, minlength=n)}
+        for name, values in self.ride_metrics.items():
+            if name.startswith('max_'):
+                out[name] = zeros(n, dtype=int64)
+                maximum.at(out[name], group_id, values)
+            else:
+                out[name] = zeros((n,) + values.shape[1:])
+                add.at(out[name], group_id, values)
+
+        return [tuple(g) for g in groups.tolist()], out
+
+    @staticmethod
+    def _avg(total, count):
+        return '' if not count else int(total / count)
+
+    @staticmethod
+    def _hours(seconds):
+        return str(timedelta(seconds=int(seconds)))
+
+    def _metrics_rows(self, labels, m, gears_order):
+        rows = []
+        for i, label in enumerate(labels):
+            rows.append(list(label) + [
+                f"{m['distance'][i]:.2f}",
+                self._hours(m['elapsed_msec'][i] / 1000),
+                int(m['max_engine_rpm'][i]),
+                int(m['max_wheel_speed'][i]),
+                int(m['max_water_temperature'][i]),
+                self._avg(m['idle_engine_rpm_sum'][i], m['idle_count'][i]),
+                self._avg(m['moving_wheel_speed_sum'][i],
+                          m['moving_count'][i]),
+            ] + [self._hours(s) for s in m['gear_time'][i][gears_order]])
+        return rows
+
+    def _histogram_rows(self, labels, values, width):
+        used = flatnonzero(values.sum(axis=0))
+        last = used[-1] + 1 if len(used) else 0
+        headers = [f"{b*width}-" for b in range(last)]
+        rows = [list(label) + [self._hours(s) for s in v[:last]]
+                for label, v in zip(labels, values)]
+        return headers, rows
+
+    def report(self, period='week', tablefmt='plain'):
+
+        gears = self.table.gears
+        gears_order = sorted(range(len(gears)), key=gears.__getitem__)
+        headers = ['Distance (km)', 'Time', 'Max rpm', 'Max km/h',
+                   'Max temp', 'Avg idle rpm', 'Avg km/h'] + \
+            [f"Gear {gears[g]}" for g in gears_order]
+
+        labels = [[n, r['bike'], r['date'].strftime('%Y-%m-%d'), r['title']]
+                  for n, r in enumerate(self.rides, 1)]
+        text = ['Rides', '=====', '', tabulate(
+            self._metrics_rows(labels, self.ride_metrics, gears_order),
+            headers=['Ride', 'Bike', 'Date', 'Title'] + headers,
+            tablefmt=tablefmt, disable_numparse=True)]
+
+        name = periods[period][0]
+        keys, m = self.rollup(period)
+        rollup_headers = ['Bike', name, 'Rides'] + headers
+        labels = [list(k) + [int(r)] for k, r in zip(keys, m.get(
+            'rides', []))]
+        text += ['', f"{name}ly rollup", '=' * len(f"{name}ly rollup"), '',
+                 tabulate(self._metrics_rows(labels, m, gears_order)
+                          if keys else [],
+                          headers=rollup_headers, tablefmt=tablefmt,
+                          disable_numparse=True)]
+
+        labels = [list(k) for k in keys]
+        for title, values, width in [
+                ('Time at each speed (km/h)', m.get('speed_histogram'),
+                 speed_bin),
+                ('Time at each engine speed (rpm)', m.get('rpm_histogram'),
+                 rpm_bin)]:
+            if values is None:
+                continue
+            bins, rows = self._histogram_rows(labels, values, width)
+            text += ['', title, '-' * len(title), '', tabulate(
+                rows, headers=['Bike', name] + bins, tablefmt=tablefmt,
+                disable_numparse=True)]
+
+        return '\n'.join(text)
+
+
+def collection_main(
+        paths,
+        output_dir = None,
+        silent = False,
+        period = 'week',
+        jobs = None,
+        channels = None,
+        cache = None
+        ) -> None:
+    """
+    Report of many rides with the rollups by bike and period
+    """
+
+    files = expand_paths(paths)
+
+    if not files:
+        bye("no CSV files found.", 1)
+
+    collection = RideCollection(files, channels=channels,
+                                cache=cache).load(jobs=jobs)
+
+    for filename, error in collection.errors:
+        print(f"Skip {repr(filename)}: {error}", file=stderr)
+
+    if not len(collection):
+        bye("no rides could be read.", 2)
+
+    report_text = collection.report(period=period)
+
+    if output_dir is None:
+        output_dir = Path('.')
+    report_filename = Path(output_dir) / f"rides_{period}ly_report.txt"
+
+    if not silent:
+        print(f"Make file {repr(str(report_filename))}...", end="")
+
+    with atomic_open(report_filename) as file:
+        print(report_text, file=file)
+
+    if not silent:
+        print(" Ok")
+        print()
+        print(report_text)
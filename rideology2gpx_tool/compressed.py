@@ -0,0 +1,117 @@
+import gzip
+from io import TextIOWrapper, RawIOBase
+from pathlib import Path
+
+
+# Compressions of the output files, the value is the suffix added
+compressions = {'gz': '.gz', 'zst': '.zst'}
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('the zstandard package is needed for .zst files '
+                          '(pip install zstandard)') from None
+    return zstandard
+
+
+def has_zstandard():
+    try:
+        _zstandard()
+    except ImportError:
+        return False
+    return True
+
+
+def compression(filename):
+    """
+    Compression of a file from its suffix ('gz', 'zst' or None)
+    """
+    suffix = Path(filename).suffix
+    for name, value in compressions.items():
+        if suffix==value:
+            return name
+    return None
+
+
+def stem(filename):
+    """
+    Name of the file without its suffix nor the compression one
+    (ride.csv.gz -> ride)
+    """
+    path = Path(filename)
+    if compression(path) is not None:
+        path = path.with_suffix('')
+    return path.stem
+
+
+def suffix(value, compress=None):
+    """
+    suffix (e.g. '.gpx') followed by the one of the compression
+    """
+    return value if compress is None else value + compressions[compress]
+
+
+def open_binary(filename):
+    """
+    Open a file to read bytes, decompressed on the fly if needed
+    """
+    compress = compression(filename)
+    if compress=='gz':
+        return gzip.open(filename, 'rb')
+    if compress=='zst':
+        return _zstandard().open(filename, 'rb')
+    return open(filename, 'rb')
+
+
+def open_text(filename):
+    """
+    Open a file to read text, decompressed on the fly if needed
+    """
+    if compression(filename) is None:
+        return open(filename, 'r')
+    return TextIOWrapper(open_binary(filename))
+
+
+class _Compressor(RawIOBase):
+    """
+    Compressed stream over a binary file, closing it also closes the file
+    """
+
+    def __init__(self, stream, file):
+        self._stream = stream
+        self._file = file
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._stream.write(data)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._stream.close()
+        finally:
+            self._file.close()
+            super().close()
+
+
+def compressor(file, filename):
+    """
+    Binary file to write the content of filename, compressed on the fly
+    into file if the suffix of filename asks for it
+    """
+    compress = compression(filename)
+    if compress=='gz':
+        # No name nor time in the header, the same ride gives the same file
+        return _Compressor(gzip.GzipFile(filename='', mode='wb',
+                                         fileobj=file, mtime=0), file)
+    if compress=='zst':
+        writer = _zstandard().ZstdCompressor().stream_writer(
+            file, closefd=False)
+        return _Compressor(writer, file)
+    return file
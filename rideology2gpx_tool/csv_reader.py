@@ -0,0 +1,69 @@
+from .channels import channels
+
+
+default_chunk_size = 65536
+
+
+class CsvReader():
+    """
+    Incremental reader of the CSV files exported by the Rideology App.
+
+    The metadata block ("Title,,...", "Distance,,...", etc.) is read when
+    the reader is created, then the data rows are yielded in chunks of at
+    most chunk_size rows, so the whole file is never held in memory.
+    """
+
+    sep = ','
+
+    names = list(channels.keys())
+
+    def __init__(self, file, chunk_size=default_chunk_size):
+        self._file = file
+        self._pending = None
+        self.chunk_size = chunk_size
+        self.header = self._read_header()
+
+    def _split(self, line):
+        # Only the first field is stripped, the callers strip the fields
+        # they use
+        fields = line.rstrip('\r\n').split(self.sep)
+        fields[0] = fields[0].strip()
+        return fields
+
+    def _is_column_names(self, fields):
+        return fields[0].replace('"', '')==self.names[0]
+
+    def _read_header(self):
+        header = {}
+        for line in self._file:
+            fields = self._split(line)
+            if self._is_column_names(fields):
+                break
+            if len(fields)==len(self.names):
+                # No column names line, this is already a data row
+                self._pending = fields
+                break
+            key, sep, value = line.rstrip('\r\n').partition(self.sep*2)
+            if sep:
+                header.setdefault(key, value)
+        return header
+
+    def rows(self):
+        if self._pending is not None:
+            yield self._pending
+            self._pending = None
+        for line in self._file:
+            fields = self._split(line)
+            if len(fields)==len(self.names) and \
+                    not self._is_column_names(fields):
+                yield fields
+
+    def chunks(self):
+        chunk = []
+        for fields in self.rows():
+            chunk.append(fields)
+            if len(chunk)>=self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
@@ -1,12 +1,56 @@
-import plotly.express as px
-from plotly.graph_objects import Figure, Table
+from copy import copy
+from contextlib import contextmanager
+from io import StringIO
 from pathlib import Path
 from datetime import timedelta
 from datetime import datetime
 from tabulate import tabulate
 from collections import namedtuple
-from pandas import DataFrame, Series, to_numeric
+from numpy import unique, flatnonzero, searchsorted, argmax, concatenate
+from numpy import asarray, arange, int8, int64
+from .table import Table
+from .channels import channels, required_channels, select_channels
+from .csv_reader import CsvReader, default_chunk_size
+from . import mmap_reader
+from .geo import cumulative_distance, extend_cumulative_distance
+from .stats import RideStats
+from .events import gear_shifts, top_speed_runs, acceleration_runs
+from .events import at_rows
+from .spatial import GridIndex
+from .resample import TimeIndex
 from .gpx_file import GpxFile
+from .render import Renderer
+from .profiling import Timings
+from .output import OutputWriter
+from .compressed import open_text, open_binary, compression, suffix
+from .compressed import stem
+from .downsample import downsample
+from .simplify import simplify_track
+
+
+# Two points per pixel of the 800 px wide graphs
+default_max_points = 1600
+
+# Distance from a location to take a point as passing through it
+default_radius_m = 25
+
+
+@contextmanager
+def _output(writer=None, timings=None):
+    """
+    The given writer, or a new one that is closed (waiting for the files
+    to be on disk) at the end of the block
+    """
+    if writer is not None:
+        yield writer
+        return
+    with OutputWriter() as writer:
+        yield writer
+        if timings is None:
+            writer.close()
+        else:
+            with timings.stage('write'):
+                writer.close()
 
 
 class Coordinate(namedtuple('Coordinate', ('latitude', 'longitude'))):
@@ -36,65 +80,186 @@ class Coordinate(namedtuple('Coordinate', ('latitude', 'longitude'))):
 
 class DataFile():
 
-    def __init__(self, filename):
+    def __init__(self, filename, chunk_size=default_chunk_size, cache=None,
+                 channels=None):
         self._filename = Path(filename)
+        self._chunk_size = chunk_size
+        self._channels = select_channels(channels)
+        self._ride_cache = cache
         self._text = None
+        self._header = None
         self._table = None
         self._title = None
+        self._cache = {}
+        self._offset = None
+        self._gears = None
 
     @property
     def filename(self):
         return self._filename        
 
+    @property
+    def stem(self):
+        """
+        Name of the file without the suffixes (ride.csv.gz -> ride)
+        """
+        return stem(self._filename)
+
     def __str__(self):
         if self._text is None:
-            file = open(self._filename, "r")
-            self._text = ""
-            with file:
-                for line in file.readlines():
-                    self._text += line
+            with open_text(self._filename) as file:
+                self._text = file.read()
         return self._text
-    
+
+    @property
+    def header(self):
+        if self._header is None:
+            with open_text(self._filename) as file:
+                self._header = CsvReader(file).header
+        return self._header
+
     @property
     def table(self):
         if self._table is None:
 
-            sep = ','
+            key = None
+            if self._ride_cache is not None:
+                key = self._ride_cache.key(self._filename, self._channels)
+                cached = self._ride_cache.load(key)
+                if cached is not None:
+                    table, self._header = cached
+                    self._set_table(table)
+                    return self._table
 
-            all_names = ['elapsed_msec', 'gps_latitude', 'gps_longitude',
-                        'instant_fuel_consumption', 'water_temperature',
-                        'boost_temperature', 'engine_rpm', 'wheel_speed',
-                        'acceleration', 'throttle_position',
-                        'accel_grip_position', 'boost_pressure',
-                        'gear_position', 'brake_pressure_fr_caliper',
-                        'lean_angle', 'rideology_score']
-            
-            formulas = {
-                'elapsed_time': lambda d: timedelta(
-                    seconds=float(int(d['elapsed_msec']))/1000),
-                'gps_latitude': lambda d: float(d['gps_latitude']),
-                'gps_longitude': lambda d: float(d['gps_longitude']),
-                'water_temperature': lambda d: int(
-                    float(d['water_temperature'])),
-                'engine_rpm': lambda d: int(float(d['engine_rpm'])),
-                'wheel_speed': lambda d: int(float(d['wheel_speed'])),
-                'gear_position': lambda d: str(d['gear_position'])
-            }
-
-            self._table = []
-            i=0
-            for line in str(self).split('\n'):
-                line_list = [f.strip() for f in line.split(sep)]
-                if len(line_list)==len(all_names) and \
-                        line_list[0].replace('"', '')!=all_names[0]:
-                    full_data = dict(zip(all_names, line_list))
-                    i+=1
-                    row = {'index': i}
-                    for name in formulas.keys():
-                        row[name] = formulas[name](full_data)
-                    self._table.append(row)
+            self._set_table(self._parse())
+
+            if key is not None:
+                self._ride_cache.store(key, self._table, self._header)
 
         return self._table
+
+    def _parse(self):
+        if compression(self._filename) is not None:
+            # Compressed files can not be mapped, they are decompressed
+            # on the fly by the streaming parser
+            return self._parse_stream()
+        try:
+            return self._parse_mmap()
+        except (ValueError, OSError):
+            # Not regular enough for the fast path
+            return self._parse_stream()
+
+    def _parse_mmap(self):
+
+        kinds = {name: channels[name].fast_kind for name in self._channels}
+
+        self._header, columns, categories = mmap_reader.read(
+            self._filename, kinds)
+        index = arange(1, len(columns['elapsed_msec']) + 1)
+        return Table.from_lists(dict(index=index, **columns),
+                                categories['gear_position'])
+
+    def _positions(self):
+        return {name: CsvReader.names.index(name) for name in self._channels}
+
+    def _chunk_table(self, chunk, positions, gears, first_index):
+        """
+        Table of a chunk of rows, gears maps the gear values found so far
+        to their codes and is updated with the new ones
+        """
+        columns = {'index': arange(first_index, first_index+len(chunk))}
+        # Only the selected fields are stripped and converted
+        for name, k in positions.items():
+            values = [row[k].strip() for row in chunk]
+            if channels[name].kind!='category':
+                columns[name] = channels[name].convert(values)
+                continue
+            gear_values, codes = unique(values, return_inverse=True)
+            gear_codes = [gears.setdefault(str(g), len(gears))
+                          for g in gear_values]
+            columns[name] = asarray(gear_codes, dtype=int8)[codes]
+        return Table(columns, gears.keys())
+
+    def _parse_stream(self):
+
+        positions = self._positions()
+
+        gears = {}
+        tables = []
+        i = 0
+        with open_text(self._filename) as file:
+            reader = CsvReader(file, chunk_size=self._chunk_size)
+            self._header = reader.header
+            for chunk in reader.chunks():
+                tables.append(self._chunk_table(chunk, positions, gears, i+1))
+                i += len(chunk)
+        return Table.concat(tables, gears.keys(), ['index'] + self._channels)
+
+    def update(self):
+        """
+        Incremental (tail-follow) load of a file that is still being
+        written. The first call reads the whole file, then every call
+        parses only the complete rows appended since the previous one and
+        updates the cached stats, distance and gear shifts instead of
+        computing them again. Returns the number of new rows.
+        """
+
+        if self._offset is None:
+            self._offset = 0
+            self._header = {}
+            self._gears = {}
+            self._set_table(Table.concat(
+                [], (), ['index'] + self._channels))
+
+        with open_binary(self._filename) as file:
+            file.seek(self._offset)
+            data = file.read()
+        # A partial last line is left for the next call
+        data = data[:data.rfind(b'\n') + 1]
+        if not data:
+            return 0
+        self._offset += len(data)
+
+        reader = CsvReader(StringIO(data.decode()))
+        for key, value in reader.header.items():
+            self._header.setdefault(key, value)
+        rows = list(reader.rows())
+        if not rows:
+            return 0
+
+        old = self._table
+        new = self._chunk_table(rows, self._positions(), self._gears,
+                                len(old) + 1)
+        self._set_table(Table.concat([old, new], self._gears.keys(),
+                                     old.names), keep=['stats',
+                                     'cumulative_distance', 'gear_shifts'])
+
+        if 'stats' in self._cache:
+            self._cache['stats'].merge(RideStats(new))
+        if 'cumulative_distance' in self._cache:
+            self._cache['cumulative_distance'] = extend_cumulative_distance(
+                self._cache['cumulative_distance'],
+                self._table.column('gps_latitude'),
+                self._table.column('gps_longitude'))
+        if 'gear_shifts' in self._cache:
+            # The shifts are found from the last moving row already seen
+            moving = flatnonzero(old.column('wheel_speed'))
+            start = int(moving[-1]) if len(moving) else 0
+            shifts = gear_shifts(self._table[start:])
+            shifts = shifts[shifts['index']>len(old)]
+            self._cache['gear_shifts'] = concatenate([
+                self._cache['gear_shifts'].astype(shifts.dtype), shifts])
+
+        return len(new)
+
+    def _set_table(self, table, keep=()):
+        self._table = table
+        self._cache = {k: v for k, v in self._cache.items() if k in keep}
+
+    def _cached(self, key, fnc):
+        if key not in self._cache:
+            self._cache[key] = fnc()
+        return self._cache[key]
     
     def load(self):
         self.table
@@ -108,18 +273,13 @@ class DataFile():
     @property
     def title(self):
         if self._title is None:
-            self._title = list(filter(lambda s: s.startswith('Title,,'),
-                                      str(self).split('\n')))[0][7:]
+            self._title = self.header.get('Title', '')
         return self._title
         
     @title.setter
     def title(self, value):
         self._title = value
 
-    @staticmethod
-    def _lst_avg(lst): 
-        return sum(lst) / len(lst)
-
     @staticmethod
     def _timedelta_str(td):
         return str(timedelta(seconds=int(td.total_seconds())))
@@ -138,101 +298,60 @@ class DataFile():
              self.table[-1]['gps_longitude']
         )
 
+    @property
+    def stats(self):
+        return self._cached('stats', lambda: RideStats(self.table))
+
     @property
     def max_engine_rpm(self):
-        return max([r['engine_rpm'] for r in self.table ])
+        return self.stats.max_engine_rpm
 
     @property
     def max_wheel_speed(self):
-        return max([r['wheel_speed'] for r in self.table ])
+        return self.stats.max_wheel_speed
 
     @property
     def max_water_temperature(self):
-        return max([r['water_temperature'] for r in self.table ])
+        return self.stats.max_water_temperature
 
     @property
     def elapsed_time(self):
-        times = [r['elapsed_time'] for r in self.table ]
-        return max(times) - min(times)
+        return self.stats.elapsed_time
 
     @property
     def avg_idle_speed(self):
-        try:   
-            return int(self._lst_avg([r['engine_rpm'] for r in self.table if
-                r['engine_rpm'] and r['wheel_speed']==0 and r[
-                    'water_temperature']>80 and r['gear_position']=='N']))
-        except ZeroDivisionError:
-            return None
+        return self.stats.avg_idle_speed
 
     @property
     def gears_list(self):
-        l = list(set([r['gear_position'] for r in self.table ]))
-        l.sort()
-        return l
+        return self.stats.gears_list
 
     @property
     def max_engine_rpm_for_each_gear(self):
-        out = {}
-        for gear in self.gears_list:
-            if gear!='N':
-                out[gear] = max(
-                    [r['engine_rpm'] for r in self.table if r[
-                        'gear_position']==gear])
-        return(out)
+        return self.stats.max_engine_rpm_for_each_gear
 
     @property
     def gear_shifts(self):
-        out = []
-        last_row = None
-        for row in self.table:
-            if not last_row:
-                last_row = row
-                continue
-            if not row['wheel_speed']:
-                continue
-            if row['gear_position']!=last_row['gear_position']:
-                r = {}
-                for k in ['elapsed_time', 'gps_latitude', 'gps_longitude',
-                        'engine_rpm', 'wheel_speed', 'gear_position']:
-                    r[k] = row[k]
-                r['last_gear_position']=last_row['gear_position']
-                out.append(r)
-            last_row = row
-        return out
+        """
+        Structured array of events, see events.gear_shifts()
+        """
+        return self._cached('gear_shifts', lambda: gear_shifts(self.table))
 
     @property
     def max_wheel_speed_info(self):
-        out = []
-        top = self.max_wheel_speed
-        last = None
-        for row in self.table:
-            if row['wheel_speed']==top:
-                r = {}
-                for k in ['index', 'elapsed_time', 'gps_latitude',
-                        'gps_longitude', 'engine_rpm', 'wheel_speed',
-                        'gear_position']:
-                    r[k] = row[k]
-                if not last or last['index']+1!=r['index'] :
-                    out.append(r)
-                last = r
-        return out
+        """
+        Structured array of events, see events.top_speed_runs()
+        """
+        return self._cached('max_wheel_speed_info', lambda: top_speed_runs(
+            self.table, self.max_wheel_speed))
 
     @property
     def max_wheel_speed_for_each_gear(self):
-        out = {}
-        for gear in self.gears_list:
-            if gear!='N':
-                out[gear] = max(
-                    [r['wheel_speed'] for r in self.table if r[
-                        'gear_position']==gear])
-        return(out)
+        return self.stats.max_wheel_speed_for_each_gear
 
     @property
     def avg_speed(self):
-        try:
-            return int(self._lst_avg([r['wheel_speed'] for r in self.table if r['wheel_speed']]))
-        except ZeroDivisionError:
-            return None
+        return self.stats.avg_speed
 
     @property
     def max_for_each_gear(self):
@@ -256,17 +375,19 @@ class DataFile():
         if tablefmt=='plain':
             F = lambda x: f"{x}:"
 
-        table.append([F('Max engine speed'), f"{self.max_engine_rpm} rpm"])
-        table.append([F('Max wheel speed'), f"{self.max_wheel_speed} km/h"])
-        table.append([F('Max water temp'), f"{self.max_water_temperature} ℃"])
+        stats = self.stats
+
+        table.append([F('Max engine speed'), f"{stats.max_engine_rpm} rpm"])
+        table.append([F('Max wheel speed'), f"{stats.max_wheel_speed} km/h"])
+        table.append([F('Max water temp'), f"{stats.max_water_temperature} ℃"])
 
-        if self.avg_idle_speed:
-            table.append([F('Avg idle speed'), f"{self.avg_idle_speed} rpm"])
+        if stats.avg_idle_speed:
+            table.append([F('Avg idle speed'), f"{stats.avg_idle_speed} rpm"])
 
-        if self.avg_speed:
-            table.append([F('Avg speed'), f"{self.avg_speed} km/h"])
+        if stats.avg_speed:
+            table.append([F('Avg speed'), f"{stats.avg_speed} km/h"])
         
-        table.append([F('Total time'), f"{self._timedelta_str(self.elapsed_time)}"])
+        table.append([F('Total time'), f"{self._timedelta_str(stats.elapsed_time)}"])
         table.append([F('Distance'), f"{self.distance:.2f} km"])
         table.append([F('Starting point'), str(self.start)])
         table.append([F('Ending point'), str(self.end)])
@@ -283,18 +404,15 @@ class DataFile():
 
         return tabulate(table, **kargs)
 
+    @property
+    def cumulative_distance(self):
+        return self._cached('cumulative_distance', lambda: cumulative_distance(
+            self.table.column('gps_latitude'),
+            self.table.column('gps_longitude')))
+
     @property
     def distance(self):
-        km = 0
-        prev_latitude = self.table[0]['gps_latitude']
-        prev_longitude = self.table[0]['gps_longitude']
-        for r in self.table:
-            latitude, longitude = r['gps_latitude'], r['gps_longitude']
-            delta_latitude = abs(latitude - prev_latitude)
-            delta_longitude = abs(longitude - prev_longitude)
-            km += ((delta_latitude**2 + delta_longitude**2)**0.5) * 111.321
-            prev_latitude, prev_longitude = latitude, longitude
-        return km
+        return float(self.cumulative_distance[-1])
 
     @property
     def report(self):  
@@ -310,105 +428,208 @@ Max for each gear
 {tabulate(self.max_for_each_gear, headers={'gear':'Gear', 'kmh':'km/h'}, tablefmt='plain')}
 """
     
+    def view(self, rows):
+        """
+        A DataFile over some rows of this one (a slice, a boolean mask or
+        an array of positions). The header, title and settings are shared
+        and nothing is parsed again, with a slice even the columns are
+        shared (NumPy views), so many derived rides can be made from a
+        single parse.
+        """
+        return self._derive(self.table[rows])
+
+    def _derive(self, table):
+        derived = copy(self)
+        derived._table = table
+        derived._cache = {}
+        derived._offset = None
+        return derived
+
+    @property
+    def time_index(self):
+        return self._cached('time_index', lambda: TimeIndex(self.table))
+
+    def resampled(self, period_msec):
+        """
+        A DataFile with a row every period_msec (e.g. 100 for 10 Hz), see
+        resample.TimeIndex.resample()
+        """
+        return self._derive(self.time_index.resample(self.table,
+                                                     period_msec))
+
     def filter_by_distance(self, d):
+        """
+        A view without the first d km (or the last -d km if d < 0)
+        """
         if not d:
             return self
+        km = self.cumulative_distance
         if d<0:
-            total = self.distance + d
-        km = 0
-        prev_latitude = self.table[0]['gps_latitude']
-        prev_longitude = self.table[0]['gps_longitude']
-        new_table = []
-        for r in self.table:
-            latitude, longitude = r['gps_latitude'], r['gps_longitude']
-            delta_latitude = abs(latitude - prev_latitude)
-            delta_longitude = abs(longitude - prev_longitude)
-            km += ((delta_latitude**2 + delta_longitude**2)**0.5) * 111.321
-            if d<0:
-                if km<=total:
-                    new_table.append(r)
-            else:
-                if km>=d:
-                    new_table.append(r)
-            prev_latitude, prev_longitude = latitude, longitude
-        self._table = new_table
-        return self
-
+            total = km[-1] + d
+            return self.view(slice(None, searchsorted(km, total, 'right')))
+        return self.view(slice(searchsorted(km, d, 'left'), None))
 
     def filter_by_speed(self, min_=0.0, max_=None):
+        """
+        A view from the last stop (speed <= min_) before reaching max_ to
+        the first row at max_ (by default the top speed)
+        """
 
         if max_ is None:
             max_ = self.max_wheel_speed
 
-        new_table_to_max = []
-        for r in self.table:
-            new_table_to_max.append(r)
-            if r['wheel_speed'] >= max_:
-                break
-        new_table_to_max.reverse()
-        
-        new_table = []
-        for r in new_table_to_max:
-            new_table.append(r)
-            if r['wheel_speed'] <= min_:
-                break
-        new_table.reverse()
-        
-        self._table = new_table
-        
-        return self
+        wheel_speed = self.table.column('wheel_speed')
+
+        end = flatnonzero(wheel_speed >= max_)
+        end = end[0] if len(end) else len(wheel_speed) - 1
+
+        start = flatnonzero(wheel_speed[:end+1] <= min_)
+        start = start[-1] if len(start) else 0
+
+        return self.view(slice(start, end+1))
+
+    @property
+    def spatial_index(self):
+        """
+        Grid index of the track points, see spatial.GridIndex
+        """
+        return self._cached('spatial_index', lambda: GridIndex(
+            self.table.column('gps_latitude'),
+            self.table.column('gps_longitude')))
+
+    def near(self, lat, lon, metres=default_radius_m):
+        """
+        Positions of the rows at most metres away from (lat, lon)
+        """
+        return self.spatial_index.radius(lat, lon, metres)
+
+    def passes_at(self, lat, lon, metres=default_radius_m):
+        """
+        Structured array of events (see events.at_rows()), with the
+        closest row of each pass of the ride through (lat, lon)
+        """
+        return at_rows(self.table, self.spatial_index.closest_passes(
+            lat, lon, metres))
+
+    def acceleration_runs(self, min_=0, max_=100):
+        """
+        Structured array with every run from min_ to max_ km/h, see
+        events.acceleration_runs()
+        """
+        return self._cached(('acceleration_runs', min_, max_),
+                            lambda: acceleration_runs(
+                                self.table, self.cumulative_distance,
+                                min_, max_))
+
+    def _runs_report(self, runs):
+        table = []
+        for n, run in enumerate(runs, 1):
+            table.append([
+                n,
+                self._timedelta_str(run['elapsed_time'].item()),
+                f"{run['duration'].item().total_seconds():.1f}",
+                f"{run['distance']*1000:.0f}",
+                f"{run['start_speed']}-{run['end_speed']}",
+                run['max_engine_rpm'],
+                run['gears'],
+            ])
+        return tabulate(table, headers=['Run', 'Start', 'Time (s)',
+                                        'Distance (m)', 'km/h', 'Max rpm',
+                                        'Gears'], tablefmt='plain',
+                        floatfmt='.1f')
 
     def data_frame(self, start_time=None):
+        """
+        The frame of the last start_time given is kept, without one the
+        times start now and the frame is not kept
+        """
 
         if start_time is None:
-            start_time = datetime.now()
+            return self._data_frame(datetime.now())
 
-        columns = ['Time', 'Latitude', 'Longitude', 'Water temperature',
-                   'Engine RPM', 'Wheel speed', 'Gear position']
-        keys = {
-            'Time': 'elapsed_time',
-            'Latitude': 'gps_latitude',
-            'Longitude': 'gps_longitude',
-            'Water temperature': 'water_temperature',
-            'Engine RPM': 'engine_rpm',
-            'Wheel speed': 'wheel_speed',
-            'Gear position': 'gear_position'
-        }
+        cached = self._cache.get('data_frame')
+        if cached is None or cached[0]!=start_time:
+            cached = (start_time, self._data_frame(start_time))
+            self._cache['data_frame'] = cached
+        return cached[1]
 
-        transform = {
-            'elapsed_time': lambda x: x + start_time,
-            'gear_position': lambda x: (0 if x=='N' else int(x)),
-            'default': lambda x: x
-        }
+    def _data_frame(self, start_time):
 
-        df = DataFrame(columns=columns)
-        
-        for i, r in enumerate(self.table):
-            row = {}
-            for c in columns:
-                k = keys[c]
-                fnc = transform.get(k, transform.get('default', lambda x: x))
-                row[c] = fnc(r[k])
-            df.loc[i+1] = Series(row)
+        from pandas import DataFrame, Timestamp, to_timedelta
 
-        for field in ['Latitude', 'Longitude', 'Water temperature',
-                      'Engine RPM', 'Wheel speed', 'Gear position']:
-            df[field] = to_numeric(df[field])
+        table = self.table
 
-        return df
+        gears = asarray([0 if g=='N' else int(g) for g in table.gears],
+                        dtype=int64)
 
-    def dump_md(self, basename=None, start_time=None, silent=True,
-                output_dir=None):
+        data = {
+            'Time': Timestamp(start_time) + to_timedelta(
+                table.column('elapsed_msec'), unit='ms'),
+            'Latitude': table.column('gps_latitude'),
+            'Longitude': table.column('gps_longitude'),
+            'Water temperature': table.column(
+                'water_temperature').astype(int64),
+            'Engine RPM': table.column('engine_rpm').astype(int64),
+            'Wheel speed': table.column('wheel_speed').astype(int64),
+            'Gear position': gears[table.column('gear_position')],
+        }
+
+        for name in self._channels:
+            if name not in required_channels:
+                data[name.replace('_', ' ').capitalize()] = table.column(name)
+
+        return DataFrame(data, index=arange(1, len(table) + 1))
 
+    def _output_name(self, basename=None, output_dir=None):
+        """
+        The basename of the output files (the stem of the ride by default)
+        and the path they are named from, in output_dir or else next to
+        the ride
+        """
         if basename is None:
-            basename = self.filename.stem
+            basename = self.stem
         else:
             basename = Path(basename).stem
 
         if output_dir is None:
             filename = self.filename.with_name(basename)
         else:
-            filename = (output_dir / Path(basename)) 
+            filename = Path(output_dir) / basename
+
+        return basename, filename
+
+    def dump_md(self, basename=None, start_time=None, silent=True,
+                output_dir=None, renderer=None, image_format='jpeg',
+                max_points=default_max_points, plot_method='lttb',
+                timings=None, writer=None):
+        """
+        Make the graphs and the md report. The figures are queued in the
+        renderer, if one is given it is up to the caller to render them.
+
+        Each series is downsampled to about max_points before plotting
+        (0 or None to plot every row), the maximum is always kept.
+        """
+
+        if timings is None:
+            timings = Timings()
+
+        with timings.stage('import plotly'):
+            import plotly.express as px
+            from plotly.graph_objects import Figure, Table
+
+        basename, filename = self._output_name(basename, output_dir)
+
+        if start_time is None:
+            start_time = datetime.now()
+
+        with timings.stage('data frame', rows=len(self)):
+            df = self.data_frame(start_time=start_time)
+
+        own_renderer = renderer is None
+        if own_renderer:
+            renderer = Renderer(image_format=image_format)
+
+        stage = timings.start('figures', rows=len(self))
 
         for field, unit in [
                 ("Wheel speed", "km/h"),
@@ -419,9 +640,13 @@ Max for each gear
             posname = "_".join([''] + field.strip().split()).lower()
             title = f"{field}, {' '.join(self.title.split())}"
             
-            df = self.data_frame(start_time=start_time)
-            
-            fig = px.area(df, x='Time', y=field)
+            plot_df = df
+            if max_points and len(df) > max_points:
+                plot_df = df.iloc[downsample(
+                    self.table.column('elapsed_msec'), df[field].to_numpy(),
+                    max_points, method=plot_method)]
+
+            fig = px.area(plot_df, x='Time', y=field)
             
             base_kargs = dict(showgrid=True, gridwidth=1,
                               gridcolor='LightPink',
@@ -455,16 +680,8 @@ Max for each gear
 
             fig.update_layout(title=title)
 
-            image_filename = filename.with_name(
-                f"{basename}{posname}").with_suffix('.jpeg')
-
-            if not silent:
-                print(f"Make file {repr(str(image_filename))}...", end="")
-            
-            fig.write_image(image_filename, width=800, height=350)
-
-            if not silent:
-                print(" Ok")
+            renderer.add(fig, filename.with_name(f"{basename}{posname}"),
+                         width=800, height=350)
 
         def get_values(table):
             values = []
@@ -490,16 +707,8 @@ Max for each gear
 
         fig.update_layout(title=title)
 
-        image_filename = filename.with_name(
-            f"{basename}_table").with_suffix('.jpeg')
-
-        if not silent:
-            print(f"Make file {repr(str(image_filename))}...", end="")
-        
-        fig.write_image(image_filename, width=500, height=450)
-
-        if not silent:
-            print(" Ok")
+        renderer.add(fig, filename.with_name(f"{basename}_table"),
+                     width=500, height=450)
 
         table = [[r[k] for k in ['gear', 'rpm', 'kmh']
                   ] for r in self.max_for_each_gear]
@@ -518,16 +727,15 @@ Max for each gear
 
         fig.update_layout(title=title)
 
-        image_filename = filename.with_name(
-            f"{basename}_max_for_each_gear").with_suffix('.jpeg')
+        renderer.add(fig, filename.with_name(f"{basename}_max_for_each_gear"),
+                     width=550, height=350)
 
-        if not silent:
-            print(f"Make file {repr(str(image_filename))}...", end="")
-        
-        fig.write_image(image_filename, width=550, height=350)
+        timings.stop(stage)
 
-        if not silent:
-            print(" Ok")
+        if own_renderer:
+            with timings.stage('render'):
+                with renderer:
+                    renderer.render(silent=silent)
 
         max_for_each_gear_str = tabulate(
             self.max_for_each_gear,
@@ -537,6 +745,9 @@ Max for each gear
         ).replace('|---', '| --'
         ).replace('|\n| --', '|\n| :-')
 
+        # HTML graphs are linked, not embedded
+        img = '' if renderer.image_format=='html' else '!'
+
         md = f"""# {' '.join(self.title.split())}
 
 {self._table_report_str(tablefmt="github")}
@@ -547,9 +758,9 @@ Max for each gear
 
 ## Graphics
 
- ![Wheel speed graph]({basename}_wheel_speed.jpeg)
- ![Engine rpm graph]({basename}_engine_rpm.jpeg)
- ![Gear position graph]({basename}_gear_position.jpeg)
+ {img}[Wheel speed graph]({basename}_wheel_speed{renderer.suffix})
+ {img}[Engine rpm graph]({basename}_engine_rpm{renderer.suffix})
+ {img}[Gear position graph]({basename}_gear_position{renderer.suffix})
 
 """
         report_filename = filename.with_name(
@@ -558,46 +769,73 @@ Max for each gear
         if not silent:
             print(f"Make file {repr(str(report_filename))}...", end="")
 
-        with open(report_filename, "w") as file:
-            print(md, file=file)
+        with timings.stage('md report'), _output(writer) as writer:
+            writer.write_text(report_filename, f"{md}\n")
 
         if not silent:
             print(" Ok")
 
-    def dump(self, basename=None, show_report=False, silent=True,
-             start_time=None, output_dir=None):
+        return renderer.timings
 
-        if basename is None:
-            basename = self.filename.stem
-        else:
-            basename = Path(basename).stem
-
-        if output_dir is None:
-            filename = self.filename.with_name(basename)
-        else:
-            filename = (output_dir / Path(basename)) 
-
-        self.new_gpxfile(start_time=start_time).dump_to_file(
-            filename.with_name(basename), silent=silent)
+    def dump(self, basename=None, show_report=False, silent=True,
+             start_time=None, output_dir=None, tolerance=None,
+             timings=None, writer=None, compress=None, creator=None):
+        """
+        The GPX files and the report are serialized here and written by
+        a writer thread (a new one unless given, see output.OutputWriter),
+        so the disk writes of each file overlap with the next one. With
+        compress ('gz' or 'zst') they are compressed on the fly. For
+        creator see new_gpxfile().
+        """
+
+        if timings is None:
+            timings = Timings()
+
+        with _output(writer, timings) as writer:
+            self._dump(basename, show_report, silent, start_time,
+                       output_dir, tolerance, timings, writer, compress,
+                       creator)
+
+    def _dump(self, basename, show_report, silent, start_time, output_dir,
+              tolerance, timings, writer, compress, creator):
+
+        gpx_suffix = suffix('.gpx', compress)
+
+        basename, filename = self._output_name(basename, output_dir)
+
+        with timings.stage('gpx track') as stage:
+            gpxfile = self.new_gpxfile(start_time=start_time,
+                                       tolerance=tolerance, creator=creator)
+            gpxfile.dump_to_file(filename.with_name(basename), gpx_suffix,
+                                 silent=silent, writer=writer)
+            stage['rows'] = gpxfile.track_points_count
+
+        if tolerance is not None and not silent:
+            points = gpxfile.track_points_count
+            print(f"Track simplified from {len(self)} to {points} points "
+                  f"({1 - points/len(self):.1%} reduction)")
         
-        self.new_gpxfile_gear_shifts(start_time=start_time).dump_to_file(
-            filename.with_name(f"{basename}_gear_shifts"),
-            silent=silent)
+        with timings.stage('gpx gear shifts', rows=len(self)):
+            self.new_gpxfile_gear_shifts(
+                start_time=start_time, creator=creator).dump_to_file(
+                filename.with_name(f"{basename}_gear_shifts"), gpx_suffix,
+                silent=silent, writer=writer)
         
-        self.new_gpxfile_speed_shifts(start_time=start_time).dump_to_file(
-            filename.with_name(f"{basename}_speed_shifts"),
-            silent=silent)
+        with timings.stage('gpx speed shifts', rows=len(self)):
+            self.new_gpxfile_speed_shifts(
+                start_time=start_time, creator=creator).dump_to_file(
+                filename.with_name(f"{basename}_speed_shifts"), gpx_suffix,
+                silent=silent, writer=writer)
         
         report_filename = filename.with_name(
-            f"{basename}_report").with_suffix('.txt')
+            f"{basename}_report").with_suffix(suffix('.txt', compress))
 
         if not silent:
             print(f"Make file {repr(str(report_filename))}...", end="")
         
-        report_text = self.report
-
-        with open(report_filename, "w") as file:
-            print(report_text, file=file)
+        with timings.stage('report', rows=len(self)):
+            report_text = self.report
+            writer.write_text(report_filename, f"{report_text}\n")
 
         if not silent:
             print(" Ok")
@@ -605,17 +843,39 @@ Max for each gear
         if show_report:
             print(report_text)
 
-    def new_gpxfile(self, postitle="", start_time=None):
-
-        gpxfile = GpxFile(start_time=start_time)
+    def simplified_indices(self, tolerance=0):
+        return self._cached(('simplified_indices', tolerance),
+                            lambda: simplify_track(
+                                self.table.column('gps_latitude'),
+                                self.table.column('gps_longitude'),
+                                tolerance))
+
+    def new_gpxfile(self, postitle="", start_time=None, tolerance=None,
+                    first=0, creator=None):
+        """
+        With a tolerance (in metres) the track is simplified, see
+        simplify.simplify_track(). Only the track points from the row
+        first on are added (see GpxFile.append_to_file()), the way points
+        are always the ones of the whole ride.
+
+        The creator of the GPX files of every new_gpxfile_*() can be
+        given, with gpx_file.legacy_creator the files are the same as the
+        ones of the old versions.
+        """
+
+        gpxfile = GpxFile(start_time=start_time, creator=creator)
         gpxfile.name = self.title + postitle
         gpxfile.desc = gpxfile.name
 
-        keys = ['gps_latitude', 'gps_longitude', 'elapsed_time']
-        
-        for p in self.table:
-            args = [p[k] for k in keys]
-            gpxfile.add_track_point(*args)
+        indices = slice(first, None)
+        if tolerance is not None:
+            indices = self.simplified_indices(tolerance)
+            indices = indices[indices >= first]
+
+        gpxfile.add_track_points(
+            self.table.column('gps_latitude')[indices],
+            self.table.column('gps_longitude')[indices],
+            self.table.column('elapsed_msec')[indices] / 1000)
         
         keys = ['gps_latitude', 'gps_longitude']
         
@@ -634,9 +894,10 @@ Max for each gear
         return gpxfile
 
 
-    def new_gpxfile_gear_shifts(self, postitle=" (gear shifts)", start_time = None):
+    def new_gpxfile_gear_shifts(self, postitle=" (gear shifts)", start_time = None,
+                                creator=None):
 
-        gpxfile = GpxFile(start_time=start_time)
+        gpxfile = GpxFile(start_time=start_time, creator=creator)
         gpxfile.name = self.title + postitle
         gpxfile.desc = gpxfile.name
 
@@ -652,27 +913,147 @@ Max for each gear
         return gpxfile
 
 
-    def new_gpxfile_speed_shifts(self, chunk=1, postitle=" (speed shifts)", start_time=None):
-        gpxfile = GpxFile(start_time=start_time)
+    def new_gpxfile_acceleration_runs(self, min_=0, max_=100, postitle=None,
+                                      start_time=None, creator=None):
+        """
+        A track segment for each acceleration run, with a way point at
+        the end of the run
+        """
+
+        if postitle is None:
+            postitle = f" ({min_}-{max_} km/h runs)"
+
+        gpxfile = GpxFile(start_time=start_time, creator=creator)
         gpxfile.name = self.title + postitle
         gpxfile.desc = gpxfile.name
-        km = 0
-        prev_latitude = self.table[0]['gps_latitude']
-        prev_longitude = self.table[0]['gps_longitude']
-        m = None
-        for r in self.table:
-            if m is None or m['wheel_speed']<r['wheel_speed']:
-                m = r
-            latitude, longitude = r['gps_latitude'], r['gps_longitude']
-            delta_latitude = abs(latitude - prev_latitude)
-            delta_longitude = abs(longitude - prev_longitude)
-            km += ((delta_latitude**2 + delta_longitude**2)**0.5) * 111.321
-            if km>=chunk:
-                km=0
-                name = f"{m['wheel_speed']} km/h"
-                desc = f"{m['engine_rpm']} rpm @ {m['gear_position']} gear"
-                args = [m[k] for k in ['gps_latitude', 'gps_longitude']] + [name] + [desc]
+
+        lat = self.table.column('gps_latitude')
+        lon = self.table.column('gps_longitude')
+        seconds = self.table.column('elapsed_msec') / 1000
+
+        for n, run in enumerate(self.acceleration_runs(min_, max_), 1):
+            rows = slice(run['start'], run['end'] + 1)
+            gpxfile.new_segment()
+            gpxfile.add_track_points(lat[rows], lon[rows], seconds[rows])
+            name = f"Run {n}: {run['start_speed']}-{run['end_speed']} km/h " \
+                   f"in {run['duration'].item().total_seconds():.1f} s"
+            desc = f"{run['distance']*1000:.0f} m, " \
+                   f"{run['max_engine_rpm']} rpm max, gears {run['gears']}"
+            gpxfile.add_way_point(lat[run['end']], lon[run['end']], name,
+                                  desc)
+
+        return gpxfile
+
+    def dump_acceleration_runs(self, min_=0, max_=100, basename=None,
+                               silent=True, start_time=None, output_dir=None,
+                               split=False, writer=None, compress=None,
+                               creator=None):
+        """
+        One GPX file with a track segment for each run, or with split a
+        GPX file for each run. For creator see new_gpxfile().
+        """
+
+        basename, filename = self._output_name(basename, output_dir)
+
+        runs = self.acceleration_runs(min_, max_)
+
+        with _output(writer) as writer:
+            if split:
+                for n, run in enumerate(runs, 1):
+                    view = self.view(slice(run['start'], run['end'] + 1))
+                    view.new_gpxfile(
+                        postitle=f" (run {n}, {min_}-{max_} km/h)",
+                        start_time=start_time, creator=creator).dump_to_file(
+                            filename.with_name(f"{basename}_run_{n}"),
+                            suffix('.gpx', compress), silent=silent,
+                            writer=writer)
+            else:
+                self.new_gpxfile_acceleration_runs(
+                    min_, max_, start_time=start_time,
+                    creator=creator).dump_to_file(
+                        filename.with_name(f"{basename}_runs"),
+                        suffix('.gpx', compress), silent=silent,
+                        writer=writer)
+
+        if not silent:
+            print(f"\n{len(runs)} runs from {min_} to {max_} km/h\n")
+            if len(runs):
+                print(self._runs_report(runs))
+
+        return runs
+
+    def new_gpxfile_locations(self, locations, metres=default_radius_m,
+                              postitle=" (locations)", start_time=None,
+                              creator=None):
+        """
+        A way point for each pass through each location, locations is a
+        list of (lat, lon, name)
+        """
+
+        gpxfile = GpxFile(start_time=start_time, creator=creator)
+        gpxfile.name = self.title + postitle
+        gpxfile.desc = gpxfile.name
+
+        keys = ['gps_latitude', 'gps_longitude']
+
+        for lat, lon, label in locations:
+            for p in self.passes_at(lat, lon, metres):
+                name = f"{label}: {p['wheel_speed']} km/h"
+                desc = f"{p['engine_rpm']}rpm @ {p['gear_position']} gear"
+                args = [p[k] for k in keys] + [name] + [desc]
                 gpxfile.add_way_point(*args)
-                m = None
-            prev_latitude, prev_longitude = latitude, longitude
+
+        return gpxfile
+
+    def dump_locations(self, locations, metres=default_radius_m,
+                       basename=None, silent=True, start_time=None,
+                       output_dir=None, writer=None, compress=None,
+                       creator=None):
+        """
+        GPX file with the passes through each location, see
+        new_gpxfile_locations() (and new_gpxfile() for creator)
+        """
+
+        basename, filename = self._output_name(basename, output_dir)
+
+        self.new_gpxfile_locations(
+            locations, metres, start_time=start_time,
+            creator=creator).dump_to_file(
+                filename.with_name(f"{basename}_locations"),
+                suffix('.gpx', compress), silent=silent, writer=writer)
+
+        if not silent:
+            table = []
+            for lat, lon, label in locations:
+                for p in self.passes_at(lat, lon, metres):
+                    table.append([
+                        label,
+                        self._timedelta_str(p['elapsed_time'].item()),
+                        p['wheel_speed'],
+                        p['engine_rpm'],
+                        p['gear_position'],
+                    ])
+            print()
+            print(tabulate(table, headers=['Location', 'Time', 'km/h', 'rpm',
+                                           'Gear'], tablefmt='plain'))
+
+    def new_gpxfile_speed_shifts(self, chunk=1, postitle=" (speed shifts)", start_time=None,
+                                 creator=None):
+        gpxfile = GpxFile(start_time=start_time, creator=creator)
+        gpxfile.name = self.title + postitle
+        gpxfile.desc = gpxfile.name
+        km = self.cumulative_distance
+        wheel_speed = self.table.column('wheel_speed')
+        start = 0
+        while start < len(km):
+            end = max(start, searchsorted(
+                km, km[start - 1 if start else 0] + chunk))
+            if end >= len(km):
+                break
+            m = self.table[start + int(argmax(wheel_speed[start:end+1]))]
+            name = f"{m['wheel_speed']} km/h"
+            desc = f"{m['engine_rpm']} rpm @ {m['gear_position']} gear"
+            args = [m[k] for k in ['gps_latitude', 'gps_longitude']] + [name] + [desc]
+            gpxfile.add_way_point(*args)
+            start = end + 1
         return gpxfile
@@ -0,0 +1,66 @@
+from numpy import arange, linspace, empty, argmax, lexsort, searchsorted
+from numpy import union1d, asarray, float64, int64, r_
+
+
+methods = ['lttb', 'min_max']
+
+
+def lttb(x, y, n):
+    """
+    Largest-Triangle-Three-Buckets, returns the indices of the n points
+    that best preserve the visual shape of the (x, y) series
+    """
+    size = len(y)
+    if n>=size or n<3:
+        return arange(size)
+
+    x = asarray(x, dtype=float64)
+    y = asarray(y, dtype=float64)
+
+    # n - 2 buckets between the first and the last point
+    edges = linspace(1, size - 1, n - 1).astype(int64)
+
+    out = empty(n, dtype=int64)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        start, end = edges[i], edges[i+1]
+        next_end = edges[i+2] if i + 2 < len(edges) else size
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = abs((x[a] - avg_x) * (y[start:end] - y[a]) -
+                   (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(argmax(area))
+        out[i+1] = a
+    return out
+
+
+def min_max(y, n):
+    """
+    Keeps the minimum and the maximum of each of n/2 buckets (one bucket
+    per pixel), returns their indices
+    """
+    size = len(y)
+    if n>=size or n<2:
+        return arange(size)
+
+    buckets = n // 2
+    bucket = arange(size) * buckets // size
+    order = lexsort((y, bucket))
+    starts = searchsorted(bucket[order], arange(buckets))
+    ends = r_[starts[1:], size] - 1
+    return union1d(union1d(order[starts], order[ends]), [0, size - 1])
+
+
+def downsample(x, y, n, method='lttb'):
+    """
+    Indices of at most about n points of the series, always keeping the
+    (first) maximum of y so it can be annotated exactly
+    """
+    if method=='lttb':
+        indices = lttb(x, y, n)
+    elif method=='min_max':
+        indices = min_max(y, n)
+    else:
+        raise ValueError(f"unknown downsampling method {repr(method)}")
+    return union1d(indices, [argmax(y)]) if len(y) else indices
@@ -0,0 +1,122 @@
+from numpy import asarray, concatenate, flatnonzero, diff, zeros, int64
+from numpy import arange, where, maximum, column_stack
+
+
+def event_dtype(gears):
+    """
+    Structured dtype of the events of a table with these gear categories,
+    the field names are the keys of the Table rows
+    """
+    width = max([len(g) for g in gears] + [1])
+    return [('index', int64), ('elapsed_time', 'm8[ms]'),
+            ('gps_latitude', 'f8'), ('gps_longitude', 'f8'),
+            ('engine_rpm', 'i4'), ('wheel_speed', 'i4'),
+            ('gear_position', f"U{width}"),
+            ('last_gear_position', f"U{width}")]
+
+
+def _events(table, rows, last_codes):
+    gears = asarray(table.gears, dtype=str)
+    out = zeros(len(rows), dtype=event_dtype(table.gears))
+    out['index'] = table.column('index')[rows]
+    out['elapsed_time'] = table.column('elapsed_msec')[rows]
+    for name in ['gps_latitude', 'gps_longitude', 'engine_rpm',
+                 'wheel_speed']:
+        out[name] = table.column(name)[rows]
+    out['gear_position'] = gears[table.column('gear_position')[rows]]
+    out['last_gear_position'] = gears[last_codes]
+    return out
+
+
+def gear_shifts(table):
+    """
+    Rows where the gear differs from the one of the previous moving row
+    (the first row always counts as the previous one), the rows with the
+    wheel stopped are ignored
+    """
+    wheel_speed = table.column('wheel_speed')
+    codes = table.column('gear_position')
+    rows = concatenate([[0] if len(codes) else zeros(0, int64),
+                        flatnonzero(wheel_speed[1:]) + 1])
+    gears = codes[rows]
+    shifts = flatnonzero(diff(gears)) + 1
+    return _events(table, rows[shifts], gears[shifts - 1])
+
+
+def at_rows(table, rows):
+    """
+    Events at the given rows (e.g. the closest sample of each pass
+    through a place, see spatial.passes())
+    """
+    return _events(table, rows, table.column('gear_position')[rows])
+
+
+def top_speed_runs(table, top):
+    """
+    First row of each run of consecutive rows (by index) at the top wheel
+    speed
+    """
+    rows = flatnonzero(table.column('wheel_speed') == top)
+    first = concatenate([[True], diff(table.column('index')[rows]) != 1])
+    rows = rows[first[:len(rows)]]
+    return _events(table, rows, table.column('gear_position')[rows])
+
+
+run_dtype = [('start', int64), ('end', int64),
+             ('start_index', int64), ('end_index', int64),
+             ('elapsed_time', 'm8[ms]'), ('duration', 'm8[ms]'),
+             ('distance', 'f8'), ('start_speed', 'i4'), ('end_speed', 'i4'),
+             ('max_engine_rpm', 'i4'), ('gears', 'O')]
+
+
+def acceleration_runs(table, distance, min_, max_):
+    """
+    Every run from a row at min_ km/h or less to the first row at max_
+    km/h or more, without going back to min_ (the same window that
+    DataFile.filter_by_speed() finds, for every launch of the ride).
+
+    start and end are the positions of the rows, distance is the
+    cumulative distance (km) of the table. gears is the sequence of gears
+    of the run, like '1-2-3'.
+    """
+    if min_ >= max_:
+        raise ValueError('the minimum speed must be lower than the maximum')
+
+    wheel_speed = table.column('wheel_speed')
+    rows = arange(len(wheel_speed))
+
+    # Position of the last row at min_ or less (-1 if none yet)
+    last_low = maximum.accumulate(where(wheel_speed <= min_, rows, -1))
+    high = flatnonzero(wheel_speed >= max_)
+    starts = last_low[high]
+    # Only the first row at max_ after each launch
+    first = concatenate([[True], diff(starts) != 0])[:len(high)]
+    valid = first & (starts >= 0)
+    starts, ends = starts[valid], high[valid]
+
+    out = zeros(len(starts), dtype=run_dtype)
+    out['start'], out['end'] = starts, ends
+    index = table.column('index')
+    out['start_index'], out['end_index'] = index[starts], index[ends]
+    elapsed_msec = table.column('elapsed_msec')
+    out['elapsed_time'] = elapsed_msec[starts]
+    out['duration'] = elapsed_msec[ends] - elapsed_msec[starts]
+    out['distance'] = distance[ends] - distance[starts]
+    out['start_speed'] = wheel_speed[starts]
+    out['end_speed'] = wheel_speed[ends]
+    if len(starts):
+        # The runs do not overlap, so each one is a reduceat segment
+        bounds = column_stack([starts, ends + 1]).ravel()
+        if bounds[-1] == len(rows):
+            bounds = bounds[:-1]
+        out['max_engine_rpm'] = maximum.reduceat(
+            table.column('engine_rpm'), bounds)[::2]
+
+    gears = asarray(table.gears, dtype=object)
+    codes = table.column('gear_position')
+    for run, (s, e) in enumerate(zip(starts, ends)):
+        run_codes = codes[s:e+1]
+        changes = concatenate([[True], diff(run_codes) != 0])
+        out['gears'][run] = '-'.join(gears[run_codes[changes]])
+
+    return out
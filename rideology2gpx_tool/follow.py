@@ -0,0 +1,94 @@
+from datetime import datetime
+from pathlib import Path
+from time import monotonic, sleep
+from .data_file import DataFile
+from .main import bye
+from .compressed import compression
+
+
+default_interval = 2.0
+
+
+def follow_main(
+        filename,
+        output_dir = None,
+        silent = False,
+        start_time = None,
+        interval = default_interval,
+        idle_timeout = None,
+        channels = None
+        ) -> None:
+    """
+    Follow a CSV file that is still being written (tail -f like).
+
+    Every interval seconds the rows appended to the file are parsed and
+    their track points appended to the GPX file, until Ctrl+C or until the
+    file does not grow for idle_timeout seconds. Then the whole set of
+    files is made as usual.
+    """
+
+    if compression(filename) is not None:
+        bye(f"{repr(filename)} is compressed, it can not be followed.", 1)
+
+    datafile = DataFile(filename, channels=channels)
+
+    if start_time is None:
+        start_time = datetime.now()
+
+    basename = datafile.stem
+    if output_dir is None:
+        gpx_filename = datafile.filename.with_name(basename)
+    else:
+        gpx_filename = Path(output_dir) / basename
+    gpx_filename = gpx_filename.with_suffix('.gpx')
+
+    written = 0
+    last_change = monotonic()
+
+    try:
+        while True:
+
+            try:
+                new = datafile.update()
+            except FileNotFoundError as e:
+                bye(f"file {repr(e.filename)} not found.", 1)
+            except IsADirectoryError as e:
+                bye(f"{repr(e.filename)} is a directory, not a file.", 1)
+            except UnicodeDecodeError:
+                bye(f"{repr(filename)} is not a CSV file.", 1)
+
+            if new:
+                last_change = monotonic()
+                gpxfile = datafile.new_gpxfile(start_time=start_time,
+                                               first=written)
+                if written:
+                    gpxfile.append_to_file(gpx_filename, silent=silent)
+                else:
+                    gpxfile.dump_to_file(gpx_filename, silent=silent)
+                written = len(datafile)
+                if not silent:
+                    print(f"{len(datafile)} rows, "
+                          f"{datafile.distance:.2f} km, "
+                          f"{datafile.max_wheel_speed} km/h max, "
+                          f"{len(datafile.gear_shifts)} gear shifts")
+
+            if idle_timeout is not None and \
+                    monotonic() - last_change >= idle_timeout:
+                break
+
+            sleep(interval)
+
+    except KeyboardInterrupt:
+        pass
+
+    if len(datafile)<=1:
+        bye(f"not enough data in the file {repr(filename)}.", 2)
+
+    datafile.dump(
+        basename=basename,
+        silent=silent,
+        start_time=start_time,
+        output_dir=output_dir)
+
+    if not silent:
+        print(datafile.report)
@@ -0,0 +1,42 @@
+from numpy import radians, sin, cos, arcsin, sqrt, cumsum, concatenate
+from numpy import zeros
+
+
+# Mean Earth radius (IUGG)
+earth_radius_km = 6371.0088
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in km between two (arrays of) coordinates
+    """
+    lat1, lon1, lat2, lon2 = [radians(x) for x in [lat1, lon1, lat2, lon2]]
+    a = sin((lat2 - lat1)/2)**2 + \
+        cos(lat1) * cos(lat2) * sin((lon2 - lon1)/2)**2
+    return 2 * earth_radius_km * arcsin(sqrt(a))
+
+
+def cumulative_distance(latitude, longitude):
+    """
+    Cumulative great-circle distance in km along a track, the first point
+    is always 0
+    """
+    if not len(latitude):
+        return zeros(0)
+    steps = haversine(latitude[:-1], longitude[:-1],
+                      latitude[1:], longitude[1:])
+    return concatenate([zeros(1), cumsum(steps)])
+
+
+def extend_cumulative_distance(distance, latitude, longitude):
+    """
+    cumulative_distance() of a track whose first len(distance) points are
+    already measured, only the steps to the new points are computed
+    """
+    n = len(distance)
+    if not n:
+        return cumulative_distance(latitude, longitude)
+    steps = haversine(latitude[n-1:-1], longitude[n-1:-1],
+                      latitude[n:], longitude[n:])
+    return concatenate([distance[:-1], cumsum(concatenate(
+        [distance[-1:], steps]))])
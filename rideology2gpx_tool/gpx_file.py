@@ -1,58 +1,118 @@
-from bs4 import BeautifulSoup as BS
-from warnings import filterwarnings
+from xml.sax.saxutils import escape
+from io import StringIO, TextIOWrapper
 from pathlib import Path
 from datetime import timedelta
 from datetime import datetime
+from .output import atomic_open
 
 
-# Filter BeautifulSoup warnings
-filterwarnings("ignore", category=UserWarning)
+# Creator written by older versions (with its typo), to make files
+# identical to those, e.g. example/ride.gpx
+legacy_creator = 'rideolgy2gpx'
 
+# Track points converted to Python values at a time when written
+points_chunk = 4096
 
-class GpxFile():
 
-    def __init__(self, start_time = None):
-
-        content = """
-            <gpx xmlns="http://www.topografix.com/GPX/1/1"
-                 creator="rideology2gpx"
-                 version="1.1"
-                 xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
-                 xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd"> 
-                <metadata>
-                </metadata>
-                <trk>
-                    <trkseg>
-                    </trkseg>
-                </trk>
-            </gpx>
-        """
+class GpxWriter():
+    """
+    Streaming GPX 1.1 writer, every element is written straight to the
+    file handle as escaped XML. With pretty=True the output is indented
+    like the old BeautifulSoup prettify() based output.
+    """
+
+    creator = 'rideology2gpx'
+
+    schema = ('xmlns="http://www.topografix.com/GPX/1/1" '
+              'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+              'xsi:schemaLocation="http://www.topografix.com/GPX/1/1 '
+              'http://www.topografix.com/GPX/1/1/gpx.xsd"')
+
+    def __init__(self, file, pretty=True, indent=' ', creator=None):
+        self._file = file
+        self._pretty = pretty
+        self._indent = indent
+        if creator is not None:
+            self.creator = creator
+
+    @staticmethod
+    def _attr(value):
+        return escape(str(value), {'"': '&quot;'})
+
+    def _line(self, depth, text):
+        if self._pretty:
+            self._file.write(f"{self._indent*depth}{text}\n")
+        else:
+            self._file.write(text)
+
+    def _element(self, depth, tag, value):
+        value = escape(str(value).strip())
+        if value:
+            self._line(depth, f"<{tag}>{value}</{tag}>")
+        else:
+            self._line(depth, f"<{tag}>")
+            self._line(depth, f"</{tag}>")
+
+    def _point(self, depth, tag, lat, lon, children):
+        attrs = f'lat="{self._attr(lat)}" lon="{self._attr(lon)}"'
+        children = [c for c in children if c[1] is not None]
+        if not children:
+            self._line(depth, f"<{tag} {attrs}/>")
+            return
+        self._line(depth, f"<{tag} {attrs}>")
+        for child, value in children:
+            self._element(depth + 1, child, value)
+        self._line(depth, f"</{tag}>")
+
+    def begin(self, name=None, desc=None):
+        self._line(0, '<?xml version="1.0" encoding="utf-8"?>')
+        self._line(0, f'<gpx creator="{self._attr(self.creator)}" '
+                      f'version="1.1" {self.schema}>')
+        for tag in ['metadata', 'trk']:
+            self._line(1, f"<{tag}>")
+            for child, value in [('name', name), ('desc', desc)]:
+                if value is not None:
+                    self._element(2, child, value)
+            if tag=='metadata':
+                self._line(1, f"</{tag}>")
+        self._line(2, "<trkseg>")
+
+    def track_point(self, lat, lon, time_=None, ele=None):
+        self._point(3, 'trkpt', lat, lon, [('time', time_), ('ele', ele)])
+
+    def new_segment(self):
+        self._line(2, "</trkseg>")
+        self._line(2, "<trkseg>")
+
+    def end_track(self):
+        self._line(2, "</trkseg>")
+        self._line(1, "</trk>")
+
+    def way_point(self, lat, lon, name, desc=None):
+        self._point(1, 'wpt', lat, lon, [('name', name), ('desc', desc or None)])
+
+    def end(self):
+        self._line(0, "</gpx>")
 
-        self.soup = BS(content, features="xml")
+
+class GpxFile():
+
+    def __init__(self, start_time=None, pretty=True, creator=None):
         self._name = None
         self._desc = None
+        self._pretty = pretty
+        self._creator = creator
+        self._track_points = []
+        self._way_points = []
         if start_time is None:
             self._start_time = datetime.now()
         else:
             self._start_time = start_time
 
-
-    def _set_tag_and_value(self, value, tag_name, base_tag_name, index=0):
-        base_tag = self.soup.find(base_tag_name)
-        tag = base_tag.find(tag_name)
-        if not tag:
-            tag = self.soup.new_tag(tag_name)
-            base_tag.insert(index, tag)
-        tag.string = value
-
     def set_name(self, value):
-        self._set_tag_and_value(value, 'name', 'metadata', 0)
-        self._set_tag_and_value(value, 'name', 'trk', 0)
         self._name = value
 
     def set_desc(self, value):
-        self._set_tag_and_value(value, 'desc', 'metadata', 1)
-        self._set_tag_and_value(value, 'desc', 'trk', 1)
         self._desc = value
 
     def get_name(self):
@@ -76,90 +136,143 @@ class GpxFile():
     @desc.setter
     def desc(self, value):
         self.set_desc(value)
-    
-    def add_track_point(self, lat, lon, time_=None, ele=None):
-
-        trkseg_tag = self.soup.find('trkseg')
-        trkpt_tag = self.soup.new_tag('trkpt', attrs={'lat': lat, 'lon': lon})
-        trkseg_tag.append(trkpt_tag)
 
-        if time_ is not None:
+    def _time_str(self, time_):
 
-            if isinstance(time_, (int, float)):
-                time_ = timedelta(seconds=time_)
+        if time_ is None:
+            return None
 
-            if isinstance(time_, timedelta):
-                time_ = self._start_time + time_
+        if isinstance(time_, (int, float)):
+            time_ = timedelta(seconds=time_)
 
-            if isinstance(time_, datetime):
-                time_ = time_.isoformat() + 'Z'
+        if isinstance(time_, timedelta):
+            time_ = self._start_time + time_
 
-            time_tag = self.soup.new_tag('time')
-            time_tag.string = str(time_)
-            trkpt_tag.append(time_tag)
+        if isinstance(time_, datetime):
+            time_ = time_.isoformat() + 'Z'
 
-        if ele is not None:
+        return str(time_)
 
-            ele_tag = self.soup.new_tag('ele')
-            ele_tag.string = str(ele)
-            trkpt_tag.append(ele_tag)
+    def add_track_point(self, lat, lon, time_=None, ele=None):
+        self._track_points.append(((lat,), (lon,), (time_,), (ele,)))
 
-    def add_way_point(self, lat, lon, name, desc=None):
-        gpx_tag = self.soup.find('gpx')
-        wpt_tag = self.soup.new_tag('wpt', attrs={'lat': lat, 'lon': lon})
-        gpx_tag.append(wpt_tag)
-        name_tag = self.soup.new_tag('name')
-        name_tag.string = str(name)
-        wpt_tag.append(name_tag)
-        if desc:
-            desc_tag = self.soup.new_tag('desc')
-            desc_tag.string = str(desc)
-            wpt_tag.append(desc_tag)
+    def add_track_points(self, lats, lons, times=None, eles=None):
+        """
+        Add many track points at once, the values can be any sequence
+        (lists, NumPy arrays, etc.). They are kept as given and only
+        converted, a chunk at a time, when written.
+        """
+        self._track_points.append((lats, lons, times, eles))
 
+    def new_segment(self):
+        """
+        The next track points go to a new track segment
+        """
+        if self._track_points:
+            self._track_points.append(None)
 
-    def __str__(self):
+    @property
+    def track_points_count(self):
+        return sum([len(block[0]) for block in self._track_points
+                    if block is not None])
 
-        out = self.soup.prettify() #FIXME
+    def add_way_point(self, lat, lon, name, desc=None):
+        self._way_points.append((lat, lon, name, desc))
+
+    @staticmethod
+    def _chunk(values, start, n):
+        if values is None:
+            return [None] * n
+        values = values[start:start+n]
+        return values.tolist() if hasattr(values, 'tolist') else values
+
+    def _write_body(self, writer):
+        for block in self._track_points:
+            if block is None:
+                writer.new_segment()
+                continue
+            for start in range(0, len(block[0]), points_chunk):
+                n = min(points_chunk, len(block[0]) - start)
+                lats, lons, times, eles = [self._chunk(values, start, n)
+                                           for values in block]
+                for lat, lon, time_, ele in zip(lats, lons, times, eles):
+                    writer.track_point(lat, lon, self._time_str(time_), ele)
+        writer.end_track()
+        for lat, lon, name, desc in self._way_points:
+            writer.way_point(lat, lon, name, desc)
+        writer.end()
+
+    def write(self, file):
+        writer = GpxWriter(file, pretty=self._pretty, creator=self._creator)
+        writer.begin(self._name, self._desc)
+        self._write_body(writer)
+
+    @staticmethod
+    def _track_end(file, block_size=64*1024):
+        """
+        Offset of the last </trkseg> line of a GPX file
+        """
+        end = file.seek(0, 2)
+        start = end
+        while start > 0:
+            start = max(0, start - block_size)
+            file.seek(start)
+            data = file.read(end - start)
+            i = data.rfind(b'</trkseg>')
+            if i >= 0:
+                while i > 0 and data[i-1:i] in [b' ', b'\t']:
+                    i -= 1
+                return start + i
+            block_size *= 2
+        raise ValueError(f"no track segment in {repr(str(file.name))}")
+
+    def append_to_file(self, filename, silent=True):
+        """
+        Append the track points to the last track segment of a GPX file
+        made by dump_to_file(), without rewriting the points already in
+        it. The way points of the file are replaced by these ones.
+        """
 
-        # I need to find a better prettify()
-        new_lines = []
-        lines = out.split('\n')
-        fnc_is_tag = lambda s: s.strip().startswith('<')
-        max_i = len(lines) - 1
-        for i, l in enumerate(lines):
-            
-            prev_is_tag = fnc_is_tag(lines[i-1]) if i>0 else True
-            next_is_tag = fnc_is_tag(lines[i+1]) if i<max_i else True
-            is_tag = fnc_is_tag(l)
+        if not silent:
+            print(f"Update file {repr(str(filename))}...", end="")
 
-            if not is_tag and (next_is_tag or prev_is_tag):
-                new_lines.append(l.strip())
-            elif is_tag and not prev_is_tag:
-                new_lines.append(l.strip())
-                new_lines.append('\n')
-            elif is_tag and not next_is_tag:
-                new_lines.append(l)
-            else:
-                new_lines.append(l)
-                new_lines.append('\n')
+        with open(filename, 'r+b') as file:
+            file.seek(self._track_end(file))
+            file.truncate()
+            text = TextIOWrapper(file, encoding='utf-8')
+            self._write_body(GpxWriter(text, pretty=self._pretty,
+                                       creator=self._creator))
+            text.flush()
+            text.detach()
 
-        return ''.join(new_lines)
+        if not silent:
+            print(" Ok")
 
+    def __str__(self):
+        buffer = StringIO()
+        self.write(buffer)
+        return buffer.getvalue().rstrip('\n')
 
-    def dump_to_file(self, filename, suffix='.gpx', silent=True):
+    def dump_to_file(self, filename, suffix='.gpx', silent=True,
+                     writer=None):
+        """
+        The file is replaced atomically, with a writer (see
+        output.OutputWriter) it is written by the writer thread
+        """
 
         path = Path(filename)
 
         if suffix:
             path = path.with_suffix(suffix)
 
-        # Use path.exists() for future checks 
+        # Use path.exists() for future checks
 
         if not silent:
             print(f"Make file {repr(str(path))}...", end="")
 
-        with open(path, "w") as file:
-            print(self, file=file)
-        
+        with (atomic_open(path) if writer is None
+              else writer.open(path)) as file:
+            self.write(file)
+
         if not silent:
             print(" Ok")
@@ -1,6 +1,9 @@
-from sys import stderr, stdout
+import sys
 from datetime import datetime
-from .data_file import DataFile
+from .data_file import DataFile, default_max_points, default_radius_m
+from .cache import RideCache
+from .profiling import Timings
+from .output import OutputWriter
 from pathlib import Path
 
 
@@ -11,7 +14,7 @@ def bye(text=None, code=1) -> None:
     if text:
         print(
             (text if code==0 else f"Error, {text}"),
-            file=(stdout if code==0 else stderr)
+            file=(sys.stdout if code==0 else sys.stderr)
         )
     exit(code)
 
@@ -27,16 +30,37 @@ def main(
         starting_chop = 0,
         subtitle = '',
         do_graph = False,
-        out_filename_suffix = ''
+        out_filename_suffix = '',
+        image_format = 'jpeg',
+        plot_points = default_max_points,
+        tolerance = None,
+        channels = None,
+        runs = None,
+        split_runs = False,
+        locations = None,
+        radius = default_radius_m,
+        resample_hz = None,
+        compress = None,
+        cache = None,
+        timings = None
         ) -> None:
 
-    datafile = DataFile(filename)
+    if timings is None:
+        timings = Timings()
+
+    ride_cache = None
+    if cache:
+        ride_cache = RideCache(None if cache is True else cache)
+
+    datafile = DataFile(filename, cache=ride_cache, channels=channels)
 
     if start_time is None:
         start_time = datetime.now()
 
     try:
-        datafile.load()
+        with timings.stage('parse') as stage:
+            datafile.load()
+            stage['rows'] = len(datafile)
     except FileNotFoundError as e:
         bye(f"file {repr(e.filename)} not found.", 1)
     except IsADirectoryError as e:
@@ -48,13 +72,24 @@ def main(
         bye(f"no data in file {repr(filename)}.", 2)
 
     if ending_chop:
-        datafile.filter_by_distance(-abs(ending_chop))
+        with timings.stage('ending chop') as stage:
+            datafile = datafile.filter_by_distance(-abs(ending_chop))
+            stage['rows'] = len(datafile)
 
     if starting_chop:
-        datafile.filter_by_distance(abs(starting_chop))
+        with timings.stage('starting chop') as stage:
+            datafile = datafile.filter_by_distance(abs(starting_chop))
+            stage['rows'] = len(datafile)
 
     if min_speed is not None:
-        datafile.filter_by_speed(min_speed, max_speed)
+        with timings.stage('filter by speed') as stage:
+            datafile = datafile.filter_by_speed(min_speed, max_speed)
+            stage['rows'] = len(datafile)
+
+    if resample_hz:
+        with timings.stage('resample') as stage:
+            datafile = datafile.resampled(max(round(1000 / resample_hz), 1))
+            stage['rows'] = len(datafile)
 
     if len(datafile)<=1:
         bye(f"not enough data in the file {repr(filename)}.", 2)
@@ -62,23 +97,61 @@ def main(
     if subtitle:
         datafile.title = f"{datafile.title}, {subtitle}"
 
-    basename = datafile.filename.stem
+    basename = datafile.stem
 
     if out_filename_suffix:
         basename = Path(f"{basename}_{out_filename_suffix}").stem
 
-    datafile.dump(
-        basename=basename,
-        silent=silent,
-        start_time=start_time,
-        output_dir=output_dir)
-    
-    if do_graph:
-        datafile.dump_md(
+    # The files are written by a writer thread while the next ones are made
+    with OutputWriter() as writer:
+
+        datafile.dump(
             basename=basename,
             silent=silent,
             start_time=start_time,
-            output_dir=output_dir)
-    
+            output_dir=output_dir,
+            tolerance=tolerance,
+            timings=timings,
+            writer=writer,
+            compress=compress)
+
+        if runs is not None:
+            with timings.stage('acceleration runs', rows=len(datafile)):
+                datafile.dump_acceleration_runs(
+                    *runs,
+                    basename=basename,
+                    silent=silent,
+                    start_time=start_time,
+                    output_dir=output_dir,
+                    split=split_runs,
+                    writer=writer,
+                    compress=compress)
+
+        if locations:
+            with timings.stage('locations', rows=len(datafile)):
+                datafile.dump_locations(
+                    locations,
+                    metres=radius,
+                    basename=basename,
+                    silent=silent,
+                    start_time=start_time,
+                    output_dir=output_dir,
+                    writer=writer,
+                    compress=compress)
+
+        if do_graph:
+            datafile.dump_md(
+                basename=basename,
+                silent=silent,
+                start_time=start_time,
+                output_dir=output_dir,
+                image_format=image_format,
+                max_points=plot_points,
+                timings=timings,
+                writer=writer)
+
+        with timings.stage('write'):
+            writer.close()
+
     if not silent:
         print(datafile.report)
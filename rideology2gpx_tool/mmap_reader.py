@@ -0,0 +1,165 @@
+from io import StringIO
+from mmap import mmap, ACCESS_READ
+from numpy import frombuffer, flatnonzero, searchsorted, arange, r_, uint8
+from numpy import int64, float64, zeros, concatenate, unique, asarray
+from .csv_reader import CsvReader
+
+
+default_block_size = 16 * 1024**2
+
+# Longest numeric field accepted by the fast parser
+max_width = 24
+
+_pow10 = 10.0 ** arange(max_width)
+
+
+def _fields(block, names, n_fields, lines):
+    """
+    Start and end offsets of the selected fields of the valid lines of a
+    block (lines with exactly n_fields fields)
+    """
+    nl = flatnonzero(block == ord('\n'))
+    starts = r_[0, nl + 1]
+    ends = r_[nl, len(block)]
+    commas = flatnonzero(block == ord(','))
+    first = searchsorted(commas, starts)
+    count = searchsorted(commas, ends) - first
+    valid = count == n_fields - 1
+    starts, ends, first = starts[valid], ends[valid], first[valid]
+    out = {}
+    for name in names:
+        k = lines.index(name)
+        s = starts if k==0 else commas[first + k - 1] + 1
+        e = ends if k==n_fields-1 else commas[first + k]
+        out[name] = (s, e)
+    return len(starts), out
+
+
+def _width(starts, ends):
+    return int((ends - starts).max()) if len(starts) else 0
+
+
+def _matrix(block, starts, ends):
+    """
+    The fields as a (rows x width) matrix of bytes, padded with zeros
+    """
+    width = _width(starts, ends)
+    offsets = arange(width)
+    inside = offsets < (ends - starts)[:, None]
+    index = (starts[:, None] + offsets).clip(max=len(block) - 1)
+    return block[index] * inside
+
+
+def _parse_decimal(m, integer=False):
+    """
+    Vectorized parser of decimal numbers ([-]digits[.digits]), the result
+    is exactly what float() gives for the same text
+    """
+    digit = (m >= ord('0')) & (m <= ord('9'))
+    dot = m == ord('.')
+    minus = m == ord('-')
+    blank = (m == 0) | (m == ord(' ')) | (m == ord('\r')) | (m == ord('\t'))
+    if not (digit | dot | minus | blank).all():
+        raise ValueError('not a decimal number')
+    n_digits = digit.sum(axis=1)
+    if (n_digits == 0).any() or (n_digits > 15).any() or \
+            (dot.sum(axis=1) > 1).any() or (minus.sum(axis=1) > 1).any():
+        raise ValueError('not a decimal number')
+    if integer and dot.any():
+        raise ValueError('not an integer')
+    # Digits at the right of each position
+    right = digit[:, ::-1].cumsum(axis=1)[:, ::-1] - digit
+    mantissa = (((m - ord('0')) * digit) * _pow10[right]).sum(axis=1)
+    decimals = (digit & (dot.cumsum(axis=1) > 0)).sum(axis=1)
+    value = mantissa / _pow10[decimals]
+    value[minus.any(axis=1)] *= -1
+    return value
+
+
+def _parse_category(m):
+    if not m.shape[1]:
+        raise ValueError('empty field')
+    values, codes = unique(m.view(f"S{m.shape[1]}").ravel(),
+                           return_inverse=True)
+    return [v.decode().strip() for v in values], codes
+
+
+def read(filename, kinds, block_size=default_block_size):
+    """
+    Read the selected columns of a Rideology CSV file through mmap.
+
+    kinds maps each column to 'int', 'float' or 'category'. Only those
+    fields are parsed, straight from the mapped bytes into arrays, the
+    rest of the fields are skipped. Returns (header, columns, categories).
+
+    Raises ValueError if the file is not regular enough for the fast path
+    (the caller is expected to fall back to the streaming parser).
+    """
+    names = CsvReader.names
+    n_fields = len(names)
+
+    with open(filename, 'rb') as file:
+        mm = mmap(file.fileno(), 0, access=ACCESS_READ)
+        try:
+            return _read(mm, names, n_fields, kinds, block_size)
+        except ValueError as e:
+            # Only the message is kept, the traceback holds frames with
+            # views of the mmap that would keep it from being closed
+            error = str(e)
+        finally:
+            mm.close()
+    raise ValueError(error)
+
+
+def _read(mm, names, n_fields, kinds, block_size):
+
+    column_names = mm.find(b'"elapsed_msec"')
+    if column_names < 0:
+        raise ValueError('column names not found')
+    start = mm.find(b'\n', column_names) + 1
+    if not start:
+        start = len(mm)
+
+    header = CsvReader(StringIO(mm[:start].decode())).header
+
+    buf = frombuffer(mm, dtype=uint8)
+    block = None
+    parts = {name: [] for name in kinds.keys()}
+    categories = {name: {} for name, kind in kinds.items()
+                  if kind=='category'}
+    try:
+        while start < len(buf):
+            end = min(start + block_size, len(buf))
+            if end < len(buf):
+                cut = mm.rfind(b'\n', start, end)
+                if cut < 0:
+                    cut = mm.find(b'\n', end)
+                end = len(buf) if cut < 0 else cut + 1
+            block = buf[start:end]
+            start = end
+            rows, fields = _fields(block, list(kinds.keys()), n_fields, names)
+            if not rows:
+                continue
+            if max([_width(*f) for f in fields.values()]) > max_width:
+                raise ValueError('field too long for the fast parser')
+            for name, kind in kinds.items():
+                m = _matrix(block, *fields[name])
+                if kind=='category':
+                    values, codes = _parse_category(m)
+                    lookup = asarray([categories[name].setdefault(
+                        v, len(categories[name])) for v in values],
+                        dtype=int64)
+                    parts[name].append(lookup[codes])
+                else:
+                    parts[name].append(
+                        _parse_decimal(m, integer=(kind=='int')))
+    finally:
+        # No array can point to the mmap once it is closed
+        del buf, block
+
+    columns = {}
+    for name, kind in kinds.items():
+        dtype = int64 if kind!='float' else float64
+        columns[name] = concatenate(
+            [p.astype(dtype) for p in parts[name]] + [zeros(0, dtype)])
+    return header, columns, {n: list(c.keys()) for n, c in categories.items()}
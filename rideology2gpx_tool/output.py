@@ -0,0 +1,221 @@
+import os
+from os import replace, unlink, fdopen
+from io import TextIOWrapper
+from pathlib import Path
+from queue import Queue
+from secrets import token_hex
+from threading import Thread
+from contextlib import contextmanager
+from .compressed import compressor
+
+
+default_chunk_size = 64 * 1024
+default_max_chunks = 16
+
+# Flags of the temporary files (O_BINARY only exists on Windows)
+_flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+
+
+def _temp_file(path):
+    """
+    Temporary file next to path (so it can be renamed over it), returns
+    (file, temp_filename). The file compresses what is written to it if
+    the suffix of path is the one of a compression (.gz, .zst).
+    """
+    path = Path(path)
+    while True:
+        tmp = path.with_name(f".{path.name}.{token_hex(4)}.tmp")
+        try:
+            # Created with the mode of any other file (0666 less umask)
+            fd = os.open(tmp, _flags, 0o666)
+            break
+        except FileExistsError:
+            pass
+    file = fdopen(fd, 'wb')
+    try:
+        return compressor(file, path), tmp
+    except BaseException:
+        file.close()
+        _discard(tmp)
+        raise
+
+
+def _discard(tmp):
+    try:
+        unlink(tmp)
+    except OSError:
+        pass
+
+
+@contextmanager
+def atomic_open(path, encoding='utf-8'):
+    """
+    Open path to write text, the file is written to a temporary file that
+    replaces path only if the block finishes without errors, so a failed
+    or interrupted conversion never leaves a half written file
+    """
+    file, tmp = _temp_file(path)
+    try:
+        with TextIOWrapper(file, encoding=encoding) as text:
+            yield text
+    except BaseException:
+        _discard(tmp)
+        raise
+    replace(tmp, path)
+
+
+def atomic_write(path, data):
+    """
+    Write the bytes of a file through a temporary file, see atomic_open()
+    """
+    file, tmp = _temp_file(path)
+    try:
+        with file:
+            file.write(data)
+    except BaseException:
+        _discard(tmp)
+        raise
+    replace(tmp, path)
+
+
+class _Aborted(Exception):
+    pass
+
+
+class _QueuedFile():
+    """
+    File like object handed to the serializers by OutputWriter.open(),
+    the text is encoded and queued in chunks of chunk_size bytes
+    """
+
+    def __init__(self, writer, key, encoding):
+        self._writer = writer
+        self._key = key
+        self._encoding = encoding
+        self._buffer = []
+        self._size = 0
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= self._writer.chunk_size:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self._buffer:
+            data = ''.join(self._buffer).encode(self._encoding)
+            self._buffer, self._size = [], 0
+            self._writer._put(('data', self._key, data))
+
+
+class OutputWriter():
+    """
+    Writes the output files from a writer thread, so the serialization of
+    one file (GPX, report, ...) overlaps with the disk writes of the one
+    before:
+
+        with OutputWriter() as writer:
+            with writer.open('ride.gpx') as file:
+                gpxfile.write(file)
+            ...
+
+    The chunks go through a queue of at most max_chunks, which bounds the
+    memory used when the disk is slower than the serialization. Every
+    file is written to a temporary file and renamed over the destination
+    once complete. The first error of the thread is raised by close().
+    """
+
+    def __init__(self, chunk_size=default_chunk_size,
+                 max_chunks=default_max_chunks):
+        self.chunk_size = chunk_size
+        self._queue = Queue(max_chunks)
+        self._error = None
+        self._count = 0
+        self._thread = Thread(target=self._run, name='output-writer',
+                              daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        self._check()
+        self._queue.put(item)
+
+    def _check(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self):
+        files = {}
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            action, key, value = item
+            if action!='open' and key not in files:
+                # The file already failed
+                continue
+            try:
+                if action=='open':
+                    files[key] = (*_temp_file(value), value)
+                elif action=='data':
+                    files[key][0].write(value)
+                elif action=='close':
+                    file, tmp, path = files[key]
+                    file.close()
+                    replace(tmp, path)
+                    del files[key]
+                else:
+                    raise _Aborted()
+            except Exception as e:
+                if key in files:
+                    file, tmp, _ = files.pop(key)
+                    file.close()
+                    _discard(tmp)
+                if self._error is None and not isinstance(e, _Aborted):
+                    self._error = e
+        for file, tmp, _ in files.values():
+            file.close()
+            _discard(tmp)
+
+    @contextmanager
+    def open(self, path, encoding='utf-8'):
+        """
+        File like object to write the text of path, the file is complete
+        on disk some time after the block (at the latest on close())
+        """
+        self._count += 1
+        key = self._count
+        self._put(('open', key, Path(path)))
+        file = _QueuedFile(self, key, encoding)
+        try:
+            yield file
+            file.flush()
+        except BaseException:
+            self._queue.put(('abort', key, None))
+            raise
+        self._put(('close', key, None))
+
+    def write_text(self, path, text, encoding='utf-8'):
+        with self.open(path, encoding) as file:
+            file.write(text)
+
+    def close(self):
+        """
+        Wait until every file is on disk
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Keep the original error, the pending files are still written
+            self._queue.put(None)
+            self._thread.join()
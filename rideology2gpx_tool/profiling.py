@@ -0,0 +1,98 @@
+import json
+from sys import platform
+from contextlib import contextmanager
+from time import perf_counter, process_time
+from tabulate import tabulate
+
+try:
+    from resource import getrusage, RUSAGE_SELF
+except ImportError:
+    # Not available on Windows
+    getrusage = None
+
+
+timings_formats = ['table', 'json']
+
+
+def peak_rss():
+    """
+    Peak resident set size of the process in bytes (None if unknown)
+    """
+    if getrusage is None:
+        return None
+    kb = 1 if platform=='darwin' else 1024
+    return getrusage(RUSAGE_SELF).ru_maxrss * kb
+
+
+class Timings():
+    """
+    Wall time, CPU time, peak RSS and row count of each stage of a
+    conversion, recorded with:
+
+        with timings.stage('parse') as stage:
+            ...
+            stage['rows'] = len(datafile)
+
+    or with start() and stop() when a block does not fit in a with.
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    def start(self, name, rows=None):
+        return {'stage': name, 'rows': rows,
+                '_start': (perf_counter(), process_time())}
+
+    def stop(self, record):
+        wall, cpu = record.pop('_start')
+        record['wall'] = perf_counter() - wall
+        record['cpu'] = process_time() - cpu
+        record['peak_rss'] = peak_rss()
+        self.stages.append(record)
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        record = self.start(name, rows)
+        try:
+            yield record
+        finally:
+            self.stop(record)
+
+    def table(self):
+        rows = []
+        for s in self.stages:
+            rss = s['peak_rss']
+            rows.append([
+                s['stage'],
+                '' if s['rows'] is None else s['rows'],
+                f"{s['wall']:.3f}",
+                f"{s['cpu']:.3f}",
+                '' if rss is None else f"{rss/1024**2:.1f}",
+            ])
+        total = sum([s['wall'] for s in self.stages])
+        rows.append(['Total', '', f"{total:.3f}", '', ''])
+        return tabulate(rows, headers=['Stage', 'Rows', 'Wall (s)',
+                                       'CPU (s)', 'Peak RSS (MB)'],
+                        tablefmt='github', disable_numparse=True,
+                        colalign=['left'] + ['right']*4)
+
+    def json(self):
+        return json.dumps(self.stages, indent=2)
+
+    def dump(self, format_='table'):
+        if format_ not in timings_formats:
+            raise ValueError(f"unknown timings format {repr(format_)}")
+        return self.table() if format_=='table' else self.json()
+
+
+def profile(filename, fnc, *args, **kargs):
+    """
+    Run fnc(*args, **kargs) under cProfile, the stats are saved to
+    filename (see the pstats module), even if fnc exits
+    """
+    from cProfile import Profile
+    profiler = Profile()
+    try:
+        return profiler.runcall(fnc, *args, **kargs)
+    finally:
+        profiler.dump_stats(filename)
@@ -0,0 +1,119 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import perf_counter
+from .output import atomic_write
+
+
+image_formats = ['jpeg', 'png', 'webp', 'svg', 'pdf', 'html']
+
+# Seconds kaleido waits for a figure before giving up
+default_timeout = 90
+
+
+class Renderer():
+    """
+    Renders plotly figures to files.
+
+    Figures are queued with add() and written by render(), concurrently,
+    each one through a temporary file renamed over the destination.
+    With kaleido >= 1.0 they go through a single kaleido server (one
+    browser with a tab per worker) kept while the renderer is open, so
+    the browser is not started again for each figure. With the 'html'
+    format kaleido is not used at all.
+    """
+
+    def __init__(self, image_format='jpeg', workers=5,
+                 timeout=default_timeout):
+        if image_format not in image_formats:
+            raise ValueError(f"unknown image format {repr(image_format)}")
+        self.image_format = image_format
+        self.workers = workers
+        self.timeout = timeout
+        self.timings = []
+        self._jobs = []
+        self._open = False
+        self._server = False
+
+    @property
+    def suffix(self):
+        return f".{self.image_format}"
+
+    def open(self):
+        """
+        The kaleido server is started by render(), once a figure was
+        rendered without it
+        """
+        self._open = True
+
+    def _start_server(self):
+        if self._server or not self._open or self.image_format=='html':
+            return
+        try:
+            import kaleido
+            start = kaleido.start_sync_server
+        except (ImportError, AttributeError):
+            # kaleido < 1.0 already keeps a single process alive
+            return
+        start(n=self.workers, timeout=self.timeout, silence_warnings=True)
+        self._server = True
+
+    def close(self):
+        self._open = False
+        if self._server:
+            import kaleido
+            kaleido.stop_sync_server(silence_warnings=True)
+            self._server = False
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, fig, filename, width, height):
+        """
+        Queue a figure, returns the path of the file that will be written
+        """
+        path = Path(filename).with_suffix(self.suffix)
+        self._jobs.append((fig, path, width, height))
+        return path
+
+    def _render_one(self, job):
+        fig, path, width, height = job
+        start = perf_counter()
+        if self.image_format=='html':
+            data = fig.to_html(include_plotlyjs='cdn', default_width=width,
+                               default_height=height).encode('utf-8')
+        else:
+            data = fig.to_image(format=self.image_format, width=width,
+                                height=height)
+        atomic_write(path, data)
+        return path, perf_counter() - start
+
+    def render(self, silent=True):
+        """
+        Render every queued figure, returns a list of (path, seconds)
+        """
+        jobs, self._jobs = self._jobs, []
+        if not jobs:
+            return []
+
+        timings = []
+        if not self._server:
+            # A kaleido server that fails to start (e.g. Chrome is not
+            # installed) does not raise, every figure sent to it would
+            # wait forever. Rendered on its own the first figure raises
+            # the error, and the server is only started if it works.
+            timings.append(self._render_one(jobs.pop(0)))
+            self._start_server()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            timings.extend(executor.map(self._render_one, jobs))
+
+        if not silent:
+            for path, seconds in timings:
+                print(f"Make file {repr(str(path))}... Ok ({seconds:.2f} s)")
+
+        self.timings.extend(timings)
+        return timings
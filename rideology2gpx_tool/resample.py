@@ -0,0 +1,64 @@
+from numpy import arange, argsort, searchsorted, interp, rint, diff, int64
+from .channels import channels
+from .table import Table
+
+
+class TimeIndex():
+    """
+    The elapsed_msec column of a table as a sorted int64 time index (the
+    rows are reordered only if the export has them out of order), built
+    once and used by every resampling of the table
+    """
+
+    def __init__(self, table):
+        times = table.column('elapsed_msec').astype(int64)
+        self.order = None
+        if len(times) and (diff(times) < 0).any():
+            self.order = argsort(times, kind='stable')
+            times = times[self.order]
+        self.times = times
+
+    def __len__(self):
+        return len(self.times)
+
+    def _sorted(self, values):
+        return values if self.order is None else values[self.order]
+
+    def grid(self, period_msec):
+        """
+        Times from the first to the last sample every period_msec
+        """
+        if not len(self.times):
+            return arange(0, dtype=int64)
+        return arange(self.times[0], self.times[-1] + 1, period_msec,
+                      dtype=int64)
+
+    def resample(self, table, period_msec):
+        """
+        A new Table with a row every period_msec. The continuous channels
+        are linearly interpolated, gear_position (and any category) is
+        forward filled, index numbers the new rows from 1.
+        """
+        if period_msec <= 0:
+            raise ValueError('the period must be greater than 0')
+
+        grid = self.grid(period_msec)
+        # Last sample at or before each time
+        before = (searchsorted(self.times, grid, 'right') - 1).clip(min=0)
+
+        columns = {}
+        for name in table.names:
+            values = self._sorted(table.column(name))
+            if name=='elapsed_msec':
+                columns[name] = grid
+            elif name=='index':
+                columns[name] = arange(1, len(grid) + 1, dtype=values.dtype)
+            elif name in Table.dtypes or channels[name].kind=='category':
+                columns[name] = values[before]
+            else:
+                dtype = channels[name].dtype
+                values = interp(grid, self.times, values)
+                if channels[name].kind!='float':
+                    values = rint(values)
+                columns[name] = values.astype(dtype)
+        return Table(columns, table.gears)
@@ -0,0 +1,76 @@
+from numpy import radians, cos, hypot, argmax, zeros, flatnonzero, r_
+from numpy import union1d, arange, unique, clip, asarray
+from .geo import earth_radius_km
+
+
+def project(latitude, longitude):
+    """
+    Local equirectangular projection in metres, good enough for the
+    extent of a ride
+    """
+    lat0 = radians(latitude.mean())
+    r = earth_radius_km * 1000
+    x = r * radians(longitude - longitude.mean()) * cos(lat0)
+    y = r * radians(latitude - latitude.mean())
+    return x, y
+
+
+def stationary_runs(latitude, longitude):
+    """
+    Indices of the first and last point of every run of repeated
+    coordinates (a single point is a run of one)
+    """
+    same = (latitude[1:]==latitude[:-1]) & (longitude[1:]==longitude[:-1])
+    first = flatnonzero(r_[True, ~same])
+    last = flatnonzero(r_[~same, True])
+    return first, last
+
+
+def douglas_peucker(x, y, tolerance, fixed=()):
+    """
+    Ramer-Douglas-Peucker, returns a mask of the points to keep so that
+    no dropped point is farther than tolerance from the simplified line.
+    The fixed points are always kept, each stretch between them is
+    simplified on its own.
+    """
+    n = len(x)
+    keep = zeros(n, dtype=bool)
+    if not n:
+        return keep
+    fixed = unique(r_[0, asarray(fixed, dtype=int), n - 1])
+    keep[fixed] = True
+    stack = list(zip(fixed[:-1].tolist(), fixed[1:].tolist()))
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start+1:end] - x[start], y[start+1:end] - y[start]
+        # Distance to the segment (not to the whole line)
+        length2 = dx*dx + dy*dy
+        t = clip((px*dx + py*dy) / length2, 0, 1) if length2 else 0
+        d = hypot(px - t*dx, py - t*dy)
+        i = int(argmax(d))
+        if d[i] > tolerance:
+            i += start + 1
+            keep[i] = True
+            stack.append((start, i))
+            stack.append((i, end))
+    return keep
+
+
+def simplify_track(latitude, longitude, tolerance=0):
+    """
+    Indices of the points of the simplified track. Runs of repeated
+    coordinates are collapsed to their first and last point (so the
+    first and last timestamp of each stop are kept) and the rest is
+    simplified with Douglas-Peucker using a tolerance in metres.
+    """
+    if not len(latitude):
+        return arange(0)
+    first, last = stationary_runs(latitude, longitude)
+    x, y = project(latitude[first], longitude[first])
+    stops = first != last
+    # The stops are kept, so they split the track for Douglas-Peucker
+    kept = first[douglas_peucker(x, y, tolerance, flatnonzero(stops))]
+    return union1d(kept, last[stops])
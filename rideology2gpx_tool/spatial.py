@@ -0,0 +1,117 @@
+from numpy import radians, degrees, cos, floor, argsort, searchsorted, asarray
+from numpy import concatenate, arange, flatnonzero, sort, int64
+from .geo import haversine, earth_radius_km
+
+
+default_cell_m = 50.0
+
+
+class GridIndex():
+    """
+    Spatial index of track points: the points are projected to metres
+    (equirectangular, around the mean latitude) and bucketed in square
+    cells of cell_m. The cells are stored sorted, one contiguous range of
+    the sorted points each, so a query only touches the cells around it.
+    Queries return positions of the points (rows of the table), sorted.
+    """
+
+    def __init__(self, latitude, longitude, cell_m=default_cell_m):
+        self._lat = asarray(latitude)
+        self._lon = asarray(longitude)
+        self.cell_m = cell_m
+        self._cos_lat = cos(radians(self._lat.mean())) if len(self._lat) \
+            else 1.0
+        ix, iy = self._cells(self._lat, self._lon)
+        self._ix0 = int(ix.min()) if len(ix) else 0
+        self._iy0 = int(iy.min()) if len(iy) else 0
+        self._nx = int(ix.max()) - self._ix0 + 1 if len(ix) else 0
+        self._ny = int(iy.max()) - self._iy0 + 1 if len(iy) else 0
+        keys = (ix - self._ix0) * self._ny + (iy - self._iy0)
+        self._order = argsort(keys, kind='stable')
+        self._keys = keys[self._order]
+
+    def __len__(self):
+        return len(self._lat)
+
+    def _cells(self, lat, lon):
+        scale = earth_radius_km * 1000 / self.cell_m
+        x = radians(lon) * self._cos_lat * scale
+        y = radians(lat) * scale
+        return floor(x).astype(int64), floor(y).astype(int64)
+
+    def _candidates(self, lat_min, lon_min, lat_max, lon_max):
+        """
+        Positions of the points in the cells covering the box
+        """
+        ix, iy = self._cells(asarray([lat_min, lat_max]),
+                             asarray([lon_min, lon_max]))
+        ix_min = max(int(ix.min()) - self._ix0, 0)
+        ix_max = min(int(ix.max()) - self._ix0, self._nx - 1)
+        iy_min = max(int(iy.min()) - self._iy0, 0)
+        iy_max = min(int(iy.max()) - self._iy0, self._ny - 1)
+        if ix_min > ix_max or iy_min > iy_max:
+            return arange(0)
+        # One contiguous range of keys for each column of cells
+        columns = arange(ix_min, ix_max + 1) * self._ny
+        starts = searchsorted(self._keys, columns + iy_min, 'left')
+        ends = searchsorted(self._keys, columns + iy_max, 'right')
+        return concatenate([arange(0)] + [self._order[s:e] for s, e in zip(
+            starts.tolist(), ends.tolist()) if e > s])
+
+    def bbox(self, lat_min, lon_min, lat_max, lon_max):
+        """
+        Positions of the points inside the box
+        """
+        rows = self._candidates(lat_min, lon_min, lat_max, lon_max)
+        lat, lon = self._lat[rows], self._lon[rows]
+        inside = (lat >= lat_min) & (lat <= lat_max) & \
+            (lon >= lon_min) & (lon <= lon_max)
+        return sort(rows[inside])
+
+    def radius(self, lat, lon, metres):
+        """
+        Positions of the points at most metres away from (lat, lon)
+        """
+        dlat = degrees(metres / (earth_radius_km * 1000))
+        dlon = dlat / max(cos(radians(lat)), 1e-9)
+        rows = self._candidates(lat - dlat, lon - dlon,
+                                lat + dlat, lon + dlon)
+        km = haversine(lat, lon, self._lat[rows], self._lon[rows])
+        return sort(rows[km * 1000 <= metres])
+
+    def nearest(self, lat, lon, metres):
+        """
+        Position of the nearest point at most metres away, or None
+        """
+        rows = self.radius(lat, lon, metres)
+        if not len(rows):
+            return None
+        km = haversine(lat, lon, self._lat[rows], self._lon[rows])
+        return int(rows[km.argmin()])
+
+    def closest_passes(self, lat, lon, metres, groups=None):
+        """
+        Position of the closest point of each pass through (lat, lon),
+        see passes()
+        """
+        out = []
+        for rows in passes(self.radius(lat, lon, metres), groups):
+            km = haversine(lat, lon, self._lat[rows], self._lon[rows])
+            out.append(rows[km.argmin()])
+        return asarray(out, dtype=int64)
+
+
+def passes(rows, groups=None):
+    """
+    Split sorted positions into runs of consecutive positions (each time
+    the track goes through a place), returns a list of arrays. With
+    groups (e.g. the ride_id column) a run never spans two groups.
+    """
+    split = rows[1:] != rows[:-1] + 1
+    if groups is not None:
+        split |= groups[rows[1:]] != groups[rows[:-1]]
+    breaks = flatnonzero(split) + 1
+    return [r for r in [rows[s:e] for s, e in zip(
+        concatenate([[0], breaks]), concatenate([breaks, [len(rows)]]))]
+        if len(r)]
+
@@ -0,0 +1,143 @@
+from datetime import timedelta
+from numpy import full, maximum, bincount, concatenate, int64
+
+
+class RideStats():
+    """
+    Every metric of the ride report, computed together from the columns
+    of a Table. The per-gear maximums are grouped by the gear code.
+    """
+
+    def __init__(self, table):
+
+        self.gears = table.gears
+        self.count = len(table)
+
+        engine_rpm = table.column('engine_rpm')
+        wheel_speed = table.column('wheel_speed')
+        water_temperature = table.column('water_temperature')
+        elapsed_msec = table.column('elapsed_msec')
+        codes = table.column('gear_position')
+
+        n_gears = len(self.gears)
+        self.gear_count = bincount(codes, minlength=n_gears)
+        self.gear_engine_rpm_max = full(n_gears, -1, dtype=int64)
+        self.gear_wheel_speed_max = full(n_gears, -1, dtype=int64)
+        maximum.at(self.gear_engine_rpm_max, codes, engine_rpm)
+        maximum.at(self.gear_wheel_speed_max, codes, wheel_speed)
+
+        if not self.count:
+            self.engine_rpm_max = self.wheel_speed_max = None
+            self.water_temperature_max = None
+            self.elapsed_msec_min = self.elapsed_msec_max = None
+        else:
+            self.engine_rpm_max = int(self.gear_engine_rpm_max.max())
+            self.wheel_speed_max = int(self.gear_wheel_speed_max.max())
+            self.water_temperature_max = int(water_temperature.max())
+            self.elapsed_msec_min = int(elapsed_msec.min())
+            self.elapsed_msec_max = int(elapsed_msec.max())
+
+        idle = (engine_rpm != 0) & (wheel_speed == 0) & \
+            (water_temperature > 80) & (codes == table.gear_code('N'))
+        self.idle_count = int(idle.sum())
+        self.idle_engine_rpm_sum = int(engine_rpm.sum(where=idle,
+                                                      dtype=int64))
+
+        moving = wheel_speed != 0
+        self.moving_count = int(moving.sum())
+        self.moving_wheel_speed_sum = int(wheel_speed.sum(where=moving,
+                                                          dtype=int64))
+
+    @staticmethod
+    def _merge_max(a, b):
+        return b if a is None else a if b is None else max(a, b)
+
+    @staticmethod
+    def _pad(values, n, fill=-1):
+        return concatenate([values, full(n - len(values), fill,
+                                         dtype=values.dtype)])
+
+    def merge(self, other):
+        """
+        Add the rows of other (the stats of the rows appended after these
+        ones, with the same or more gear categories) to these stats
+        """
+        n_gears = len(other.gears)
+        self.gear_count = self._pad(self.gear_count, n_gears, 0) + \
+            other.gear_count
+        self.gear_engine_rpm_max = maximum(
+            self._pad(self.gear_engine_rpm_max, n_gears),
+            other.gear_engine_rpm_max)
+        self.gear_wheel_speed_max = maximum(
+            self._pad(self.gear_wheel_speed_max, n_gears),
+            other.gear_wheel_speed_max)
+        self.gears = other.gears
+        self.count += other.count
+
+        for name in ['engine_rpm_max', 'wheel_speed_max',
+                     'water_temperature_max', 'elapsed_msec_max']:
+            setattr(self, name, self._merge_max(getattr(self, name),
+                                                getattr(other, name)))
+        if self.elapsed_msec_min is None or (
+                other.elapsed_msec_min is not None and
+                other.elapsed_msec_min < self.elapsed_msec_min):
+            self.elapsed_msec_min = other.elapsed_msec_min
+
+        self.idle_count += other.idle_count
+        self.idle_engine_rpm_sum += other.idle_engine_rpm_sum
+        self.moving_count += other.moving_count
+        self.moving_wheel_speed_sum += other.moving_wheel_speed_sum
+
+        return self
+
+    @staticmethod
+    def _avg(total, count):
+        return int(total / count) if count else None
+
+    @property
+    def max_engine_rpm(self):
+        return self.engine_rpm_max
+
+    @property
+    def max_wheel_speed(self):
+        return self.wheel_speed_max
+
+    @property
+    def max_water_temperature(self):
+        return self.water_temperature_max
+
+    @property
+    def elapsed_time(self):
+        if not self.count:
+            return timedelta(0)
+        return timedelta(
+            milliseconds=self.elapsed_msec_max - self.elapsed_msec_min)
+
+    @property
+    def avg_idle_speed(self):
+        return self._avg(self.idle_engine_rpm_sum, self.idle_count)
+
+    @property
+    def avg_speed(self):
+        return self._avg(self.moving_wheel_speed_sum, self.moving_count)
+
+    @property
+    def gears_list(self):
+        l = [g for g, n in zip(self.gears, self.gear_count) if n]
+        l.sort()
+        return l
+
+    def _for_each_gear(self, values):
+        out = {}
+        for gear in self.gears_list:
+            if gear!='N':
+                out[gear] = int(values[self.gears.index(gear)])
+        return out
+
+    @property
+    def max_engine_rpm_for_each_gear(self):
+        return self._for_each_gear(self.gear_engine_rpm_max)
+
+    @property
+    def max_wheel_speed_for_each_gear(self):
+        return self._for_each_gear(self.gear_wheel_speed_max)
@@ -0,0 +1,91 @@
+from datetime import timedelta
+import numpy as np
+from .channels import channels
+
+
+class Table():
+    """
+    Columnar storage for the rows of a Rideology log, one typed array per
+    channel. The gear position is stored as a small categorical code.
+    """
+
+    # Columns that are not telemetry channels
+    dtypes = {'index': np.int64, 'ride_id': np.int32}
+
+    def __init__(self, columns, gears):
+        self._columns = columns
+        self._gears = tuple(gears)
+
+    @classmethod
+    def dtype(cls, name):
+        if name in cls.dtypes:
+            return cls.dtypes[name]
+        return channels[name].dtype
+
+    @classmethod
+    def from_lists(cls, lists, gears):
+        columns = {}
+        for name, values in lists.items():
+            columns[name] = np.asarray(values, dtype=cls.dtype(name))
+        return cls(columns, gears)
+
+    @classmethod
+    def concat(cls, tables, gears, names):
+        columns = {}
+        for name in names:
+            columns[name] = np.concatenate(
+                [t.column(name) for t in tables] +
+                [np.empty(0, cls.dtype(name))])
+        return cls(columns, gears)
+
+    @property
+    def names(self):
+        return list(self._columns.keys())
+
+    @property
+    def gears(self):
+        return self._gears
+
+    def column(self, name):
+        return self._columns[name]
+
+    def gear_code(self, gear):
+        try:
+            return self._gears.index(gear)
+        except ValueError:
+            return -1
+
+    def __len__(self):
+        return len(self._columns['index'])
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def row(self, i):
+        row = {}
+        for name, values in self._columns.items():
+            value = values[i].item()
+            if name == 'elapsed_msec':
+                row['elapsed_time'] = timedelta(seconds=float(value)/1000)
+            elif name == 'gear_position':
+                row[name] = self._gears[value]
+            else:
+                row[name] = value
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, slice) or isinstance(key, np.ndarray):
+            columns = {}
+            for name, values in self._columns.items():
+                columns[name] = values[key]
+            return Table(columns, self._gears)
+        i = int(key)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('table index out of range')
+        return self.row(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
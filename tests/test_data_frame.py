@@ -0,0 +1,29 @@
+from datetime import datetime
+from pathlib import Path
+import pytest
+from rideology2gpx_tool.data_file import DataFile
+
+pytest.importorskip('pandas')
+
+
+example = Path(__file__).resolve().parent.parent / 'example' / 'ride.csv'
+
+
+def frames(ride):
+    return [k for k in ride._cache if 'data_frame' in str(k)]
+
+
+def test_cache():
+    ride = DataFile(example)
+    for _ in range(5):
+        ride.data_frame()
+    assert frames(ride) == []
+
+    first = datetime(1979, 8, 9, 9, 25)
+    df = ride.data_frame(first)
+    assert ride.data_frame(first) is df
+    assert str(df['Time'].iloc[0]) == '1979-08-09 09:25:00.940000'
+
+    second = datetime(2000, 1, 1)
+    assert ride.data_frame(second) is not df
+    assert len(frames(ride)) == 1
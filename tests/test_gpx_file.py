@@ -0,0 +1,84 @@
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pytest
+from rideology2gpx_tool.data_file import DataFile
+from rideology2gpx_tool.gpx_file import GpxFile, GpxWriter, legacy_creator, \
+    points_chunk
+
+
+example_dir = Path(__file__).resolve().parent.parent / 'example'
+
+# Starting time of the example GPX files
+start_time = datetime(1979, 8, 9, 9, 25)
+
+
+@pytest.fixture(scope='module')
+def ride():
+    return DataFile(example_dir / 'ride.csv')
+
+
+# The example track was made by an older version, the shifts by a newer
+# one with the creator fixed
+@pytest.mark.parametrize('method, name, creator', [
+    ('new_gpxfile', 'ride.gpx', legacy_creator),
+    ('new_gpxfile_gear_shifts', 'ride_gear_shifts.gpx', None),
+    ('new_gpxfile_speed_shifts', 'ride_speed_shifts.gpx', None),
+])
+def test_example_output(ride, method, name, creator):
+    gpxfile = getattr(ride, method)(start_time=start_time, creator=creator)
+    expected = (example_dir / name).read_text()
+    assert f"{gpxfile}\n" == expected
+
+
+@pytest.mark.parametrize('creator, names', [
+    (legacy_creator, ['ride.gpx']),
+    (None, ['ride_gear_shifts.gpx', 'ride_speed_shifts.gpx',
+            'ride_report.txt']),
+])
+def test_example_dump(ride, tmp_path, creator, names):
+    ride.dump(start_time=start_time, output_dir=tmp_path, creator=creator)
+    for name in names:
+        assert (tmp_path / name).read_bytes() == \
+            (example_dir / name).read_bytes(), name
+
+
+@pytest.mark.parametrize('creator', [legacy_creator, None])
+def test_dump_creator(ride, tmp_path, creator):
+    # The runs and locations files take the creator as every other output
+    row = ride.table[len(ride) // 2]
+    locations = [(row['gps_latitude'], row['gps_longitude'], 'Here')]
+    ride.dump_acceleration_runs(0, 60, output_dir=tmp_path, creator=creator)
+    ride.dump_acceleration_runs(0, 60, output_dir=tmp_path, split=True,
+                                creator=creator)
+    ride.dump_locations(locations, output_dir=tmp_path, creator=creator)
+    expected = f'creator="{creator or GpxWriter.creator}"'
+    files = sorted(tmp_path.glob('*.gpx'))
+    assert len(files) > 2
+    for filename in files:
+        assert expected in filename.read_text(), filename.name
+
+
+def test_chunks(tmp_path):
+    # Blocks of points longer than a chunk, from arrays and from lists
+    n = points_chunk * 2 + 10
+    lats = np.linspace(-34, -35, n)
+    lons = np.linspace(-58, -59, n)
+    times = np.arange(n) * 0.5
+
+    by_block = GpxFile(start_time=start_time)
+    by_block.add_track_points(lats, lons, times)
+    by_block.new_segment()
+    by_block.add_track_points(list(lats), list(lons))
+
+    by_point = GpxFile(start_time=start_time)
+    for lat, lon, time_ in zip(lats.tolist(), lons.tolist(), times.tolist()):
+        by_point.add_track_point(lat, lon, time_)
+    by_point.new_segment()
+    for lat, lon in zip(lats.tolist(), lons.tolist()):
+        by_point.add_track_point(lat, lon)
+
+    assert by_block.track_points_count == 2 * n
+    assert str(by_block) == str(by_point)
+    by_block.dump_to_file(tmp_path / 'track', silent=True)
+    assert (tmp_path / 'track.gpx').read_text() == f"{by_point}\n"
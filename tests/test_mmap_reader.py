@@ -0,0 +1,108 @@
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+from rideology2gpx_tool.data_file import DataFile
+from rideology2gpx_tool.channels import channels
+
+base_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(base_dir / 'benchmarks'))
+
+from synthetic import generate
+
+
+example = base_dir / 'example' / 'ride.csv'
+
+
+def assert_same_table(a, b):
+    assert a.names == b.names
+    assert list(a.gears) == list(b.gears)
+    for name in a.names:
+        assert a.column(name).dtype == b.column(name).dtype, name
+        np.testing.assert_array_equal(a.column(name), b.column(name),
+                                      err_msg=name)
+
+
+def with_field(tmp_path, name, value, row=2):
+    """
+    Copy of the example ride with one field of a row replaced
+    """
+    lines = example.read_text().split('\n')
+    first = [n for n, l in enumerate(lines)
+             if l.startswith('"elapsed_msec"')][0] + 1
+    fields = lines[first + row].split(',')
+    fields[list(channels.keys()).index(name)] = value
+    lines[first + row] = ','.join(fields)
+    filename = tmp_path / 'ride.csv'
+    filename.write_text('\n'.join(lines))
+    return filename
+
+
+def parsers(filename, channels=None):
+    mmap = DataFile(filename, channels=channels)._parse_mmap()
+    stream = DataFile(filename, channels=channels)._parse_stream()
+    return mmap, stream
+
+
+def test_example():
+    assert_same_table(*parsers(example))
+
+
+def test_all_channels():
+    assert_same_table(*parsers(example, list(channels.keys())))
+
+
+def test_synthetic(tmp_path):
+    filename = generate(tmp_path / 'ride.csv', 20000, 1)
+    assert_same_table(*parsers(filename, list(channels.keys())))
+
+
+def test_decimals_as_float(tmp_path):
+    # Up to 15 significant digits, as parsed by float()
+    rng = np.random.default_rng(0)
+    lines = example.read_text().split('\n')
+    first = [n for n, l in enumerate(lines)
+             if l.startswith('"elapsed_msec"')][0] + 1
+    for n in range(first, len(lines)):
+        fields = lines[n].split(',')
+        if len(fields) < 2:
+            continue
+        digits = int(rng.integers(1, 14))
+        fields[1] = f"{rng.uniform(-90, 90):.{digits}f}"
+        lines[n] = ','.join(fields)
+    filename = tmp_path / 'ride.csv'
+    filename.write_text('\n'.join(lines))
+    mmap, stream = parsers(filename)
+    assert_same_table(mmap, stream)
+
+
+def test_crlf(tmp_path):
+    # Windows line endings, the same table and header from both parsers
+    filename = tmp_path / 'ride.csv'
+    filename.write_bytes(example.read_bytes().replace(b'\n', b'\r\n'))
+    mmap, stream = DataFile(filename), DataFile(filename)
+    assert_same_table(mmap._parse_mmap(), stream._parse_stream())
+    assert_same_table(mmap.table, DataFile(example).table)
+    header = DataFile(example).header
+    assert mmap.header == stream.header == header
+    assert not any(['\r' in value for value in header.values()])
+    assert mmap.title == 'From gas station to next gas station'
+
+
+@pytest.mark.parametrize('name, value', [
+    ('gps_latitude', '-34.50820000000000000000001'),
+    ('gps_longitude', '-58.4796400000000000000000000000000000'),
+    ('gear_position', 'N' + ' ' * 40),
+    ('gps_latitude', '-3.45082e1'),
+    ('engine_rpm', '1.104e3'),
+    ('wheel_speed', '+0.0'),
+])
+def test_fallback(tmp_path, name, value):
+    # Valid for float() but not for the fast path, that must give up
+    # cleanly so the streaming parser is used
+    filename = with_field(tmp_path, name, value)
+    with pytest.raises(ValueError):
+        DataFile(filename)._parse_mmap()
+    assert_same_table(DataFile(filename)._parse(),
+                      DataFile(filename)._parse_stream())
+    assert len(DataFile(filename).table) == len(DataFile(example).table)
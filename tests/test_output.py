@@ -0,0 +1,67 @@
+import gzip
+import os
+import stat
+import pytest
+from rideology2gpx_tool.output import OutputWriter, atomic_open
+
+
+@pytest.fixture
+def umask_027():
+    old = os.umask(0o027)
+    yield
+    os.umask(old)
+
+
+def files(path):
+    return sorted([p.name for p in path.iterdir()])
+
+
+def test_mode_follows_umask(tmp_path, umask_027):
+    with atomic_open(tmp_path / 'a.txt') as file:
+        file.write('a\n')
+    with OutputWriter() as writer:
+        writer.write_text(tmp_path / 'b.txt', 'b\n')
+    for name in ['a.txt', 'b.txt']:
+        assert stat.S_IMODE((tmp_path / name).stat().st_mode) == 0o640
+    assert os.umask(0o027) == 0o027
+
+
+def test_writer(tmp_path):
+    text = ''.join([f"line {n}\n" for n in range(100000)])
+    with OutputWriter(chunk_size=1000, max_chunks=2) as writer:
+        with writer.open(tmp_path / 'a.txt') as file:
+            for line in text.splitlines(keepends=True):
+                file.write(line)
+        writer.write_text(tmp_path / 'b.txt.gz', text)
+    assert (tmp_path / 'a.txt').read_text() == text
+    assert gzip.open(tmp_path / 'b.txt.gz', 'rt').read() == text
+    assert files(tmp_path) == ['a.txt', 'b.txt.gz']
+
+
+def test_atomic_error(tmp_path):
+    (tmp_path / 'a.txt').write_text('old')
+    with pytest.raises(KeyError):
+        with atomic_open(tmp_path / 'a.txt') as file:
+            file.write('new')
+            raise KeyError()
+    assert (tmp_path / 'a.txt').read_text() == 'old'
+    assert files(tmp_path) == ['a.txt']
+
+
+def test_writer_errors(tmp_path):
+    # A file that can not be written does not stop the others, the error
+    # is raised on close and no temporary file is left
+    (tmp_path / 'dir.txt').mkdir()
+    with pytest.raises(IsADirectoryError):
+        with OutputWriter() as writer:
+            writer.write_text(tmp_path / 'a.txt', 'a')
+            writer.write_text(tmp_path / 'dir.txt', 'x')
+            writer.write_text(tmp_path / 'b.txt', 'b')
+    assert files(tmp_path) == ['a.txt', 'b.txt', 'dir.txt']
+
+    with pytest.raises(KeyError):
+        with OutputWriter() as writer:
+            with writer.open(tmp_path / 'c.txt') as file:
+                file.write('c')
+                raise KeyError()
+    assert files(tmp_path) == ['a.txt', 'b.txt', 'dir.txt']
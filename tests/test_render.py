@@ -0,0 +1,68 @@
+import sys
+from types import ModuleType
+import pytest
+from rideology2gpx_tool.render import Renderer
+
+
+class Figure():
+
+    def __init__(self, calls, error=None):
+        self.calls = calls
+        self.error = error
+
+    def to_image(self, **kargs):
+        self.calls.append(('write', kargs['format']))
+        if self.error is not None:
+            raise self.error
+        return b'image'
+
+
+@pytest.fixture
+def kaleido(monkeypatch):
+    calls = []
+    module = ModuleType('kaleido')
+    module.start_sync_server = lambda **kargs: calls.append(('start',))
+    module.stop_sync_server = lambda **kargs: calls.append(('stop',))
+    monkeypatch.setitem(sys.modules, 'kaleido', module)
+    return calls
+
+
+def test_server_after_first_figure(tmp_path, kaleido):
+    with Renderer() as renderer:
+        for n in range(3):
+            renderer.add(Figure(kaleido), tmp_path / f"fig_{n}", 10, 10)
+        timings = renderer.render()
+    assert [p.name for p, _ in timings] == \
+        ['fig_0.jpeg', 'fig_1.jpeg', 'fig_2.jpeg']
+    assert kaleido[:2] == [('write', 'jpeg'), ('start',)]
+    assert [p.read_bytes() for p, _ in timings] == [b'image'] * 3
+    assert sorted([p.name for p in tmp_path.iterdir()]) == \
+        ['fig_0.jpeg', 'fig_1.jpeg', 'fig_2.jpeg']
+    assert kaleido[-1] == ('stop',)
+
+
+def test_error_without_server(tmp_path, kaleido):
+    # e.g. Chrome is not installed, the error is raised and the server
+    # (that would make the next figures wait forever) is never started
+    with pytest.raises(RuntimeError):
+        with Renderer() as renderer:
+            for n in range(3):
+                renderer.add(Figure(kaleido, RuntimeError('no Chrome')),
+                             tmp_path / f"fig_{n}", 10, 10)
+            renderer.render()
+    assert kaleido == [('write', 'jpeg')]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_html_without_kaleido(tmp_path, kaleido):
+
+    class Html(Figure):
+        def to_html(self, **kargs):
+            return '<html>'
+
+    with Renderer('html') as renderer:
+        renderer.add(Html(kaleido), tmp_path / 'fig', 10, 10)
+        renderer.add(Html(kaleido), tmp_path / 'fig_2', 10, 10)
+        renderer.render()
+    assert kaleido == []
+    assert (tmp_path / 'fig.html').read_text() == '<html>'
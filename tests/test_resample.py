@@ -0,0 +1,55 @@
+from pathlib import Path
+import numpy as np
+import pytest
+from rideology2gpx_tool.data_file import DataFile
+
+
+example = Path(__file__).resolve().parent.parent / 'example' / 'ride.csv'
+
+
+@pytest.fixture(scope='module')
+def ride():
+    return DataFile(example)
+
+
+def test_10_hz(ride):
+    resampled = ride.resampled(100)
+    table = resampled.table
+    times = table.column('elapsed_msec')
+    assert (np.diff(times) == 100).all()
+    assert times[0] == ride.table.column('elapsed_msec')[0]
+    np.testing.assert_array_equal(table.column('index'),
+                                  np.arange(1, len(table) + 1))
+    # The top speed is one run, as in the ride
+    assert resampled.max_wheel_speed == ride.max_wheel_speed
+    assert len(resampled.max_wheel_speed_info) == \
+        len(ride.max_wheel_speed_info) == 1
+    gpx = str(resampled.new_gpxfile())
+    assert gpx.count(f"Max speed {ride.max_wheel_speed} km/h") == 1
+
+
+def test_samples_kept(ride):
+    # On the times of the ride the values are the ones of the ride
+    table = ride.table
+    resampled = ride.resampled(20).table
+    rows = np.searchsorted(resampled.column('elapsed_msec'),
+                           table.column('elapsed_msec'))
+    for name in ['gps_latitude', 'gps_longitude', 'engine_rpm',
+                 'wheel_speed', 'gear_position']:
+        np.testing.assert_allclose(resampled.column(name)[rows],
+                                   table.column(name), err_msg=name)
+    assert list(resampled.gears) == list(table.gears)
+
+
+def test_unsorted(ride):
+    order = np.random.default_rng(0).permutation(len(ride))
+    shuffled = ride.view(order).resampled(1000).table
+    resampled = ride.resampled(1000).table
+    for name in resampled.names:
+        np.testing.assert_array_equal(shuffled.column(name),
+                                      resampled.column(name), err_msg=name)
+
+
+def test_period(ride):
+    with pytest.raises(ValueError):
+        ride.resampled(0)
@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+from rideology2gpx_tool.data_file import DataFile
+from rideology2gpx_tool.simplify import simplify_track, project
+
+base_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(base_dir / 'benchmarks'))
+
+from synthetic import generate
+
+
+def max_deviation(latitude, longitude, kept):
+    """
+    Largest distance (m) from a point to the segment of the simplified
+    track that replaces it
+    """
+    x, y = project(latitude, longitude)
+    n = np.arange(len(x))
+    k = np.searchsorted(kept, n, 'right') - 1
+    a = kept[k.clip(max=len(kept) - 2)]
+    b = kept[k.clip(max=len(kept) - 2) + 1]
+    dx, dy = x[b] - x[a], y[b] - y[a]
+    px, py = x - x[a], y - y[a]
+    length2 = dx*dx + dy*dy
+    t = np.divide(px*dx + py*dy, length2, out=np.zeros_like(px),
+                  where=length2 > 0).clip(0, 1)
+    return np.hypot(px - t*dx, py - t*dy).max()
+
+
+@pytest.fixture(scope='module')
+def ride(tmp_path_factory):
+    filename = generate(tmp_path_factory.mktemp('ride') / 'ride.csv',
+                        20000, 0)
+    table = DataFile(filename).table
+    return table.column('gps_latitude'), table.column('gps_longitude')
+
+
+@pytest.mark.parametrize('tolerance', [1, 5, 20, 100])
+def test_tolerance(ride, tolerance):
+    latitude, longitude = ride
+    kept = simplify_track(latitude, longitude, tolerance)
+    assert kept[0] == 0 and kept[-1] == len(latitude) - 1
+    assert len(kept) < len(latitude)
+    assert max_deviation(latitude, longitude, kept) <= tolerance + 1e-6
+
+
+def test_stops_kept(ride):
+    # The first and last point of every stop are in the simplified track
+    latitude, longitude = ride
+    kept = simplify_track(latitude, longitude, 20)
+    same = (latitude[1:] == latitude[:-1]) & \
+        (longitude[1:] == longitude[:-1])
+    first = np.flatnonzero(~np.r_[False, same] & np.r_[same, False])
+    last = np.flatnonzero(np.r_[False, same] & ~np.r_[same, False])
+    assert len(first) == len(last) > 0
+    assert np.isin(first, kept).all() and np.isin(last, kept).all()
+
+
+def test_zero_tolerance(ride):
+    # Only the points on the simplified track are dropped
+    latitude, longitude = ride
+    kept = simplify_track(latitude, longitude, 0)
+    assert max_deviation(latitude, longitude, kept) < 1e-6